@@ -4,20 +4,36 @@ Simple Flask server to serve the vertical bar animation and provide stats API.
 This server works alongside the youtube_moderator.py to serve the animation.
 """
 
+import argparse
+import gzip
+import hashlib
 import json
+import math
 import os
-from flask import Flask, send_file, jsonify, request
+import signal
+import socket
+import sys
+import threading
+import time
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 
+from shared_stats import PayloadTooLarge, SharedStatsStore
+from stats_history import StatsHistory
+from stats_persistence import StatsPersistence
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Get the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ANIMATION_FILE = os.path.join(BASE_DIR, "animations", "vertical-bar.html")
+ANIMATION_CACHE_SECONDS = 300  # Browser cache lifetime for the overlay page
+LISTEN_BACKLOG = 1024  # Production mode: pending connections while overlays reconnect
+MASTER_PID = os.getpid()  # Forked workers inherit the master's value
 
 # In-memory storage for stats
-stats_memory = {
+DEFAULT_STATS = {
     "online_viewers": 0,
     "total_views": 0,
     "last_updated": "Unknown",
@@ -31,26 +47,279 @@ stats_memory = {
     "comments": 0,
 }
 
+# The authoritative stats record ({"seq", "time", "stats", "recent"}) lives
+# in shared memory so every worker process serves the same state (see
+# shared_stats.py). stats_memory is this worker's copy, refreshed whenever the
+# shared version changes; the check is one lock-free read, cheap enough for
+# every request.
+STATS_WATCH_INTERVAL_SECONDS = 0.2  # How often workers look for updates made by others
+SHARED_RECENT_UPDATES = 32  # Past updates kept in the record, so slow workers miss none
+shared_stats = SharedStatsStore()
+stats_store_version, _ = shared_stats.update(
+    lambda current: {"seq": 0, "time": 0, "stats": dict(DEFAULT_STATS), "recent": []}
+)
+stats_memory = dict(DEFAULT_STATS)
+stats_update_seq = 0  # Sequence number of the last update applied locally
+
+# Push delivery for overlays: SSE subscribers block on this condition and are
+# woken only when /api/update-stats actually changes a value.
+STREAM_KEEPALIVE_SECONDS = 15  # Comment line that keeps idle proxies/OBS from closing
+STREAM_RETRY_MILLISECONDS = 3000  # Browser reconnect delay after a dropped stream
+stats_changed = threading.Condition()
+stats_version = 0
+# Responses for the current version, serialized once per change rather than
+# per request: (/api/stats body, its content hash ETag, SSE frame). Replaced
+# as a whole so readers never need a lock.
+stats_response = (b"", "", "")
+
+
+def serialize_stats():
+    """Rebuild the pre-serialized responses; call with stats_changed held."""
+    global stats_response
+    data = json.dumps({**stats_memory, "success": True})
+    body = data.encode("utf-8")
+    etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+    # Content-based id, so a client reconnecting across a restart is not
+    # mistaken for one that already has the restored stats
+    stats_response = (body, etag, f"id: {etag}\ndata: {data}\n\n")
+
+
+serialize_stats()
+
+# Time-series history of every update, kept in fixed-size ring buffers per video
+HISTORY_CAPACITY = 2880  # Samples per video (24 hours at the moderator's 30s cadence)
+HISTORY_MAX_VIDEOS = 16  # Videos tracked before the least recently updated is reused
+HISTORY_MAX_RESOLUTION = 720  # Upper bound on buckets per history query
+HISTORY_DEFAULT_WINDOW_SECONDS = 3600
+HISTORY_DEFAULT_RESOLUTION = 60
+stats_history = StatsHistory(
+    HISTORY_CAPACITY, HISTORY_MAX_VIDEOS, HISTORY_MAX_RESOLUTION
+)
+
+# Durable storage: every update goes to an append-only log on a background
+# thread, compacted into a snapshot every STATS_SNAPSHOT_INTERVAL_SECONDS.
+# With several workers only the first one writes the files.
+STATS_DATA_DIR = os.path.join(BASE_DIR, "stats_data")
+STATS_SNAPSHOT_INTERVAL_SECONDS = 60
+stats_persistence = None  # StatsPersistence once enabled in __main__
+
+
+def sync_stats():
+    """Bring this worker's copy up to date with the shared store."""
+    global stats_store_version, stats_update_seq, stats_version
+    if shared_stats.version() == stats_store_version:
+        return
+
+    with stats_changed:
+        version, record = shared_stats.read()
+        if version == stats_store_version:
+            return
+        stats_store_version = version
+        if record["seq"] <= stats_update_seq:
+            return
+
+        # Every update since the last sync goes into history and the log,
+        # not just the latest one
+        for update in record["recent"]:
+            if update["seq"] > stats_update_seq:
+                stats_history.record(
+                    update["stats"]["video_id"], update["time"], update["stats"]
+                )
+                if stats_persistence:
+                    stats_persistence.append(update)
+        stats_update_seq = record["seq"]
+
+        if record["stats"] != stats_memory:
+            stats_memory.update(record["stats"])
+            stats_version += 1
+            serialize_stats()
+            stats_changed.notify_all()
+
+
+def watch_shared_stats():
+    """Pick up updates written by other workers so SSE clients hear about them."""
+    while True:
+        time.sleep(STATS_WATCH_INTERVAL_SECONDS)
+        try:
+            sync_stats()
+        except Exception as e:
+            print(f"⚠️ Failed to sync shared stats: {e}")
+
+
+def take_stats_snapshot():
+    """Consistent copy of the stats and their history for a snapshot."""
+    with stats_changed:
+        return {
+            "seq": stats_update_seq,
+            "stats": dict(stats_memory),
+            "history": stats_history.export(),
+        }
+
+
+def restore_stats(persistence, publish=True):
+    """
+    Load the last snapshot and replay the update log written after it.
+
+    Args:
+        persistence: the StatsPersistence to read from
+        publish: also make the restored stats the shared record; a restarted
+                 worker only reloads its history and keeps the live record
+    """
+    global stats_store_version, stats_update_seq, stats_version
+    started = time.perf_counter()
+    snapshot, records = persistence.load()
+
+    with stats_changed:
+        if snapshot:
+            stats_memory.update(snapshot["stats"])
+            stats_history.restore(snapshot["history"])
+            stats_update_seq = snapshot["seq"]
+        for record in records:
+            stats_memory.update(record["stats"])
+            stats_history.record(
+                record["stats"]["video_id"], record["time"], record["stats"]
+            )
+            stats_update_seq = record["seq"]
+        if snapshot or records:
+            stats_version += 1
+            serialize_stats()
+            if publish:
+                stats_store_version, _ = shared_stats.update(
+                    lambda current: {
+                        "seq": stats_update_seq,
+                        "time": time.time(),
+                        "stats": dict(stats_memory),
+                        "recent": [],
+                    }
+                )
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(
+        f"💾 Restored stats (snapshot: {'yes' if snapshot else 'no'}, "
+        f"log records: {len(records)}) in {elapsed_ms:.1f} ms"
+    )
+
+
+# Overlay page cached in memory together with its gzip encoding
+animation_page = {"mtime": None, "body": b"", "gzip": b"", "etag": "", "gzip_etag": ""}
+animation_page_lock = threading.Lock()
+
+
+def load_animation_page():
+    """Return the cached overlay page, re-reading it if the file changed on disk."""
+    mtime = os.stat(ANIMATION_FILE).st_mtime_ns
+    with animation_page_lock:
+        if animation_page["mtime"] != mtime:
+            with open(ANIMATION_FILE, "rb") as f:
+                body = f.read()
+            etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+            animation_page.update(
+                {
+                    "mtime": mtime,
+                    "body": body,
+                    "gzip": gzip.compress(body, compresslevel=9),
+                    "etag": etag,
+                    # Each encoding is a different representation for caches
+                    "gzip_etag": etag + "-gz",
+                }
+            )
+        return dict(animation_page)
+
 
 @app.route("/anim/potuzhnist")
 def index():
     """Serve the vertical bar animation page."""
     try:
-        return send_file(ANIMATION_FILE)
+        page = load_animation_page()
     except FileNotFoundError:
         return "Animation file not found", 404
 
+    use_gzip = "gzip" in request.accept_encodings
+    etag = page["gzip_etag"] if use_gzip else page["etag"]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(page["gzip"], mimetype="text/html")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(page["body"], mimetype="text/html")
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = ANIMATION_CACHE_SECONDS
+    return response
+
 
 @app.route("/api/stats")
 def get_stats():
     """Get the current stats from memory."""
     try:
-        return jsonify(
-            {
-                **stats_memory,
-                "success": True,
-            }
-        )
+        sync_stats()
+        body, etag, _ = stats_response
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        response.cache_control.no_cache = True  # Always revalidate, usually as a 304
+        return response
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "success": False}), 500
+
+
+@app.route("/api/stats/stream")
+def stream_stats():
+    """Stream stats to overlays as Server-Sent Events, one event per change."""
+    last_event_id = request.headers.get("Last-Event-ID")
+
+    def generate():
+        sync_stats()
+        with stats_changed:
+            version = stats_version
+            _, etag, event = stats_response
+        yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+        # A reconnecting client that already has these stats gets nothing new
+        if last_event_id != etag:
+            yield event
+
+        while True:
+            with stats_changed:
+                changed = stats_changed.wait_for(
+                    lambda: stats_version != version,
+                    timeout=STREAM_KEEPALIVE_SECONDS,
+                )
+                version = stats_version
+                event = stats_response[2]
+            yield event if changed else ": keepalive\n\n"
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/stats/history")
+def get_stats_history():
+    """Get min/max/avg of the stats over a recent window, downsampled into buckets."""
+    sync_stats()
+    try:
+        video_id = request.args.get("video_id", stats_memory["video_id"])
+        window = float(request.args.get("window", HISTORY_DEFAULT_WINDOW_SECONDS))
+        resolution = int(request.args.get("resolution", HISTORY_DEFAULT_RESOLUTION))
+    except ValueError:
+        return jsonify({"error": "Invalid window or resolution", "success": False}), 400
+    if not math.isfinite(window) or window <= 0 or resolution <= 0:
+        return jsonify({"error": "Invalid window or resolution", "success": False}), 400
+
+    try:
+        history = stats_history.query(video_id, window, resolution, time.time())
+        if history is None:
+            return (
+                jsonify({"error": f"No history for video '{video_id}'", "success": False}),
+                404,
+            )
+        return jsonify({**history, "success": True})
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}", "success": False}), 500
 
@@ -63,39 +332,48 @@ def update_stats():
         if not data:
             return jsonify({"error": "No data provided", "success": False}), 400
 
-        # Update all stats fields in memory
-        global stats_memory
-        stats_memory.update(
-            {
-                "online_viewers": data.get(
-                    "online_viewers", stats_memory["online_viewers"]
-                ),
-                "total_views": data.get("total_views", stats_memory["total_views"]),
-                "last_updated": data.get("last_updated", stats_memory["last_updated"]),
-                "video_id": data.get("video_id", stats_memory["video_id"]),
-                "title": data.get("title", stats_memory["title"]),
-                "channel_title": data.get(
-                    "channel_title", stats_memory["channel_title"]
-                ),
-                "actual_start_time": data.get(
-                    "actual_start_time", stats_memory["actual_start_time"]
-                ),
-                "scheduled_start_time": data.get(
-                    "scheduled_start_time", stats_memory["scheduled_start_time"]
-                ),
-                "is_live": data.get("is_live", stats_memory["is_live"]),
-                "likes": data.get("likes", stats_memory["likes"]),
-                "comments": data.get("comments", stats_memory["comments"]),
-            }
-        )
+        def merge(current):
+            """Build the next shared record from the current one and the request."""
+            stats = current["stats"]
+            updated = dict(stats)
+            updated.update(
+                {
+                    "online_viewers": data.get(
+                        "online_viewers", stats["online_viewers"]
+                    ),
+                    "total_views": data.get("total_views", stats["total_views"]),
+                    "last_updated": data.get("last_updated", stats["last_updated"]),
+                    "video_id": data.get("video_id", stats["video_id"]),
+                    "title": data.get("title", stats["title"]),
+                    "channel_title": data.get("channel_title", stats["channel_title"]),
+                    "actual_start_time": data.get(
+                        "actual_start_time", stats["actual_start_time"]
+                    ),
+                    "scheduled_start_time": data.get(
+                        "scheduled_start_time", stats["scheduled_start_time"]
+                    ),
+                    "is_live": data.get("is_live", stats["is_live"]),
+                    "likes": data.get("likes", stats["likes"]),
+                    "comments": data.get("comments", stats["comments"]),
+                }
+            )
+            update = {"seq": current["seq"] + 1, "time": time.time(), "stats": updated}
+            recent = current["recent"][-(SHARED_RECENT_UPDATES - 1) :] + [update]
+            return {**update, "recent": recent}
+
+        # Written to shared memory so every worker serves it, then applied here
+        _, record = shared_stats.update(merge)
+        sync_stats()
 
         return jsonify(
             {
                 "message": "Stats updated successfully",
-                **stats_memory,
+                **record["stats"],
                 "success": True,
             }
         )
+    except PayloadTooLarge as e:
+        return jsonify({"error": str(e), "success": False}), 413
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}", "success": False}), 500
 
@@ -103,20 +381,175 @@ def update_stats():
 @app.route("/health")
 def health():
     """Health check endpoint."""
-    return jsonify({"status": "healthy", "message": "Animation server is running"})
+    return jsonify(
+        {
+            "status": "healthy",
+            "message": "Animation server is running",
+            # Lets load tests find every server process to measure its memory
+            "pid": os.getpid(),
+            "master_pid": MASTER_PID,
+        }
+    )
+
+
+def run_production_server(host, port, fd=None):
+    """Serve with a threaded WSGI server: no debugger, reloader or per-request logging."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(
+        host, port, app, threaded=True, request_handler=QuietRequestHandler, fd=fd
+    )
+    if fd is None:
+        # Allow a burst of overlay reconnects without refusing connections
+        server.socket.listen(LISTEN_BACKLOG)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_worker(index, restarted, host, port, fd):
+    """Body of a forked worker process."""
+    global stats_persistence
+    # Shutdown is driven by the master: ignore Ctrl+C, exit cleanly on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if stats_persistence:
+        if restarted:
+            # The history inherited from the master is stale by now
+            restore_stats(stats_persistence, publish=False)
+        if index == 0:
+            stats_persistence.start()
+        else:
+            stats_persistence = None
+
+    threading.Thread(target=watch_shared_stats, daemon=True).start()
+    try:
+        run_production_server(host, port, fd=fd)
+    finally:
+        if stats_persistence:
+            stats_persistence.stop()
+
+
+def run_workers(host, port, workers):
+    """Fork worker processes that share one listening socket and one stats store."""
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    children = {}  # pid -> worker index
+
+    def spawn(index, restarted=False):
+        pid = os.fork()
+        if pid:
+            children[pid] = index
+            return
+        try:
+            run_worker(index, restarted, host, port, sock.fileno())
+        except SystemExit:
+            pass
+        finally:
+            os._exit(0)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    for index in range(workers):
+        spawn(index)
+    print(f"👷 Started {workers} worker processes")
+
+    try:
+        while True:
+            pid, _ = os.wait()
+            index = children.pop(pid, None)
+            if index is not None:
+                print(f"⚠️ Worker {index} (pid {pid}) exited, restarting it")
+                spawn(index, restarted=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            os.waitpid(pid, 0)
+        sock.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Animation overlay server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Serve with a threaded WSGI server instead of the Flask debug server.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes sharing one stats store (implies --production).",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=STATS_DATA_DIR,
+        help="Directory for the stats snapshot and update log.",
+    )
+    parser.add_argument(
+        "--no-persist",
+        action="store_true",
+        help="Keep stats in memory only; they reset when the server restarts.",
+    )
+    args = parser.parse_args()
+
     print("Starting Animation Server...")
     print(f"Animation file: {ANIMATION_FILE}")
-    print("Storage: In-memory (no file persistence)")
+    if args.no_persist:
+        print("Storage: In-memory (no file persistence)")
+    else:
+        print(f"Storage: In-memory, persisted to {args.data_dir}")
     print("Available endpoints:")
     print("  GET  /anim/potuzhnist - Serve vertical bar animation")
     print("  GET  /api/stats       - Get all stream statistics")
+    print("  GET  /api/stats/stream - Stream stats changes (Server-Sent Events)")
+    print("  GET  /api/stats/history - Downsampled stats history for a video")
     print("  POST /api/update-stats - Update stats in memory")
     print("  GET  /health          - Health check")
-    print("\nStarting server on http://localhost:5555")
+    print(f"\nStarting server on http://localhost:{args.port}")
     print("Make sure youtube_moderator.py is running to get real-time stats!")
-    print("Stats will be stored in memory and reset when server restarts.")
+    # The debug server's reloader runs this script twice: a watching parent
+    # and the child serving requests. Only the child may touch --data-dir.
+    reloader_parent = (
+        not args.production
+        and args.workers <= 1
+        and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+    )
+    if args.no_persist:
+        print("Stats will be stored in memory and reset when server restarts.")
+    elif not reloader_parent:
+        stats_persistence = StatsPersistence(
+            args.data_dir, STATS_SNAPSHOT_INTERVAL_SECONDS, take_stats_snapshot
+        )
+        restore_stats(stats_persistence)
 
-    app.run(debug=True, host="0.0.0.0", port=5555)
+    if args.workers > 1:
+        print(f"Mode: production ({args.workers} worker processes)")
+        run_workers(args.host, args.port, args.workers)
+        sys.exit(0)
+
+    if stats_persistence:
+        stats_persistence.start()
+    try:
+        if args.production:
+            print("Mode: production (threaded WSGI server)")
+            run_production_server(args.host, args.port)
+        else:
+            app.run(debug=True, host=args.host, port=args.port)
+    finally:
+        if stats_persistence:
+            stats_persistence.stop()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Load-test the animation server with overlay traffic.
+
+Simulates N overlay clients that either poll /api/stats (revalidating with
+If-None-Match, like the overlay's fallback) or subscribe to /api/stats/stream,
+while a writer posts /api/update-stats at the moderator's cadence. Reports
+throughput, latency percentiles, how long each update takes to reach the
+overlays, and the server's memory. Start the server first:
+
+    python animation-server.py --production
+    python bench_animation_server.py --clients 300 --duration 60
+    python bench_animation_server.py --clients 500 --sse-fraction 1 --write-interval 5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+DEFAULT_WRITE_INTERVAL_SECONDS = 30  # youtube_moderator.STATS_UPDATE_INTERVAL_SECONDS
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def latency_summary(values):
+    """p50/p95/p99/max in milliseconds."""
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round((values[-1] if values else 0) * 1000, 2),
+    }
+
+
+class LoadTest:
+    """Shared state of one load-test run."""
+
+    def __init__(self, host, port, duration):
+        self.host = host
+        self.port = port
+        self.deadline = time.perf_counter() + duration
+        self.lock = threading.Lock()
+        # Writer markers: online_viewers value -> perf_counter() when it was sent
+        self.marker_base = random.randint(10**8, 10**9)
+        self.write_times = {}
+        self.propagation = []
+        self.connections = []  # SSE sockets, shut down at the deadline
+
+        self.poll_results = []  # (latencies, statuses, errors) per polling client
+        self.sse_results = []  # (connect latency or None, events, errors) per subscriber
+        self.write_latencies = []
+        self.write_errors = 0
+        self.memory_samples = []
+
+    def connect(self, timeout=10):
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def observe(self, stats, seen):
+        """Record propagation delay the first time a client sees a written value."""
+        now = time.perf_counter()
+        value = stats.get("online_viewers")
+        sent = self.write_times.get(value)
+        if sent is not None and value not in seen:
+            seen.add(value)
+            with self.lock:
+                self.propagation.append(now - sent)
+
+    def run_poller(self, interval):
+        """Poll /api/stats like an overlay without EventSource."""
+        conn = self.connect()
+        latencies = []
+        statuses = {}
+        errors = 0
+        etag = None
+        seen = set()
+
+        # Spread clients over the first interval like independently opened overlays
+        next_request = time.perf_counter() + random.uniform(0, interval)
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            if next_request > now:
+                time.sleep(min(next_request, self.deadline) - now)
+                continue
+
+            headers = {"If-None-Match": etag} if etag else {}
+            start = time.perf_counter()
+            try:
+                conn.request("GET", "/api/stats", headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = self.connect()
+                next_request = time.perf_counter() + interval
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            etag = response.getheader("ETag", etag)
+            if response.status == 200:
+                self.observe(json.loads(body), seen)
+            next_request = start + interval
+
+        conn.close()
+        with self.lock:
+            self.poll_results.append((latencies, statuses, errors))
+
+    def run_subscriber(self):
+        """Hold an SSE connection to /api/stats/stream like the overlay does."""
+        connect_latency = None
+        events = 0
+        errors = 0
+        seen = set()
+
+        while time.perf_counter() < self.deadline:
+            conn = self.connect(timeout=None)
+            start = time.perf_counter()
+            try:
+                conn.connect()
+                with self.lock:
+                    # The response keeps reading from this socket after
+                    # http.client lets go of it, so keep our own reference
+                    self.connections.append(conn.sock)
+                conn.request("GET", "/api/stats/stream")
+                response = conn.getresponse()
+                while True:
+                    line = response.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"data: "):
+                        if connect_latency is None:
+                            connect_latency = time.perf_counter() - start
+                        events += 1
+                        self.observe(json.loads(line[6:]), seen)
+            except (OSError, http.client.HTTPException, ValueError):
+                if time.perf_counter() < self.deadline:
+                    errors += 1
+            finally:
+                conn.close()
+            if time.perf_counter() < self.deadline:
+                time.sleep(1)  # Reconnect delay, like EventSource's retry
+
+        with self.lock:
+            self.sse_results.append((connect_latency, events, errors))
+
+    def run_writer(self, interval):
+        """Post /api/update-stats with a unique viewer count every `interval`."""
+        conn = self.connect()
+        marker = self.marker_base
+        next_write = time.perf_counter() + min(1.0, interval)  # Let clients connect
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            if next_write > now:
+                time.sleep(min(next_write, self.deadline) - now)
+                continue
+
+            marker += 1
+            body = json.dumps(
+                {
+                    "online_viewers": marker,
+                    "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                }
+            )
+            start = time.perf_counter()
+            self.write_times[marker] = start
+            try:
+                conn.request(
+                    "POST",
+                    "/api/update-stats",
+                    body=body,
+                    headers={"Content-Type": "application/json"},
+                )
+                conn.getresponse().read()
+                self.write_latencies.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                self.write_errors += 1
+                conn.close()
+                conn = self.connect()
+            next_write = start + interval
+        conn.close()
+
+    def run_memory_sampler(self):
+        """Sample the total RSS of the server's master and worker processes."""
+        try:
+            conn = self.connect()
+            conn.request("GET", "/health")
+            master_pid = json.loads(conn.getresponse().read())["master_pid"]
+            conn.close()
+        except (OSError, http.client.HTTPException, KeyError, ValueError):
+            return
+        while time.perf_counter() < self.deadline:
+            rss = server_rss_bytes(master_pid)
+            if rss is None:
+                return
+            self.memory_samples.append(rss)
+            time.sleep(1)
+
+    def close_connections(self):
+        """Unblock subscribers waiting for their next event."""
+        with self.lock:
+            for sock in self.connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def server_rss_bytes(master_pid):
+    """RSS of `master_pid` plus its children, from /proc (Linux only)."""
+    if not os.path.isdir(f"/proc/{master_pid}"):
+        return None
+    pids = [master_pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesized command name: state, ppid, ...
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def summarize(test, elapsed, pollers, subscribers):
+    """Merge per-client results into the report."""
+    latencies = [l for client in test.poll_results for l in client[0]]
+    statuses = {}
+    for _, client_statuses, _ in test.poll_results:
+        for status, count in client_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    connects = [c[0] for c in test.sse_results if c[0] is not None]
+    writes = len(test.write_latencies)
+    mb = 1024 * 1024
+
+    return {
+        "clients": {"polling": pollers, "sse": subscribers},
+        "duration_seconds": round(elapsed, 1),
+        "polling": {
+            "requests": len(latencies),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "errors": sum(client[2] for client in test.poll_results),
+            "latency_ms": latency_summary(latencies),
+            "statuses": statuses,
+        },
+        "sse": {
+            "connected": len(connects),
+            "events": sum(client[1] for client in test.sse_results),
+            "errors": sum(client[2] for client in test.sse_results),
+            "first_event_ms": latency_summary(connects),
+        },
+        "writes": {
+            "sent": writes,
+            "errors": test.write_errors,
+            "latency_ms": latency_summary(test.write_latencies),
+        },
+        "propagation_ms": {
+            "observed": len(test.propagation),
+            # Every client should see every write
+            "expected": writes * (pollers + subscribers),
+            **latency_summary(test.propagation),
+        },
+        "server_memory_mb": {
+            "start": round(test.memory_samples[0] / mb, 1) if test.memory_samples else None,
+            "peak": round(max(test.memory_samples) / mb, 1) if test.memory_samples else None,
+            "end": round(test.memory_samples[-1] / mb, 1) if test.memory_samples else None,
+        },
+    }
+
+
+def run_load_test(
+    host, port, clients, sse_fraction, poll_interval, write_interval, duration
+):
+    subscribers = round(clients * sse_fraction)
+    pollers = clients - subscribers
+    test = LoadTest(host, port, duration)
+
+    threads = [
+        threading.Thread(target=test.run_poller, args=(poll_interval,), daemon=True)
+        for _ in range(pollers)
+    ]
+    threads += [
+        threading.Thread(target=test.run_subscriber, daemon=True)
+        for _ in range(subscribers)
+    ]
+    threads.append(threading.Thread(target=test.run_memory_sampler, daemon=True))
+    if write_interval > 0:
+        threads.append(
+            threading.Thread(target=test.run_writer, args=(write_interval,), daemon=True)
+        )
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(max(0.0, test.deadline - time.perf_counter()))
+    test.close_connections()
+    for thread in threads:
+        thread.join(timeout=15)
+    return summarize(test, time.perf_counter() - started, pollers, subscribers)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the animation server with simulated overlay clients."
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument(
+        "--sse-fraction",
+        type=float,
+        default=0.0,
+        help="Share of clients that subscribe to /api/stats/stream instead of polling.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between polls per polling client (0 = as fast as possible).",
+    )
+    parser.add_argument(
+        "--write-interval",
+        type=float,
+        default=DEFAULT_WRITE_INTERVAL_SECONDS,
+        help="Seconds between /api/update-stats writes (0 = no writer).",
+    )
+    parser.add_argument("--duration", type=float, default=60.0)
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.host,
+        args.port,
+        args.clients,
+        min(1.0, max(0.0, args.sse_fraction)),
+        args.interval,
+        args.write_interval,
+        args.duration,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
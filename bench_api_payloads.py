@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Measure what the `fields=` masks of youtube_moderator.py save per API call.
+
+Each fixture in bench_fixtures/ is a full response of one YouTube API call,
+as returned without a field mask. The mask the moderator sends is applied
+locally, which yields the same partial response the API returns, and the
+download size and json.loads() time of both versions are compared. The
+moderator's own readers are also run on the masked responses to check that
+no field it uses was masked away.
+
+    python bench_api_payloads.py
+    python bench_api_payloads.py --record   # re-record fixtures from a live stream
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+import youtube_moderator as ym
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+
+# Call -> (fixture with the full response, mask the moderator sends)
+CALLS = {
+    "liveBroadcasts.list-active": (
+        "liveBroadcasts.list-active",
+        ym.BROADCASTS_LIST_FIELDS,
+    ),
+    "liveChatMessages.list": ("liveChatMessages.list", ym.CHAT_MESSAGES_FIELDS),
+    "videos.list-metadata": ("videos.list", ym.VIDEO_METADATA_FIELDS),
+    "videos.list-counters": ("videos.list", ym.VIDEO_COUNTERS_FIELDS),
+    "liveBroadcasts.list-settings": (
+        "liveBroadcasts.list-settings",
+        ym.BROADCAST_SETTINGS_FIELDS,
+    ),
+    "liveBroadcasts.update": ("liveBroadcasts.update", ym.BROADCAST_UPDATE_FIELDS),
+    "liveChatMessages.insert": ("liveChatMessages.insert", ym.WRITE_RESPONSE_FIELDS),
+}
+
+
+def parse_fields(spec):
+    """
+    Parse a partial-response mask ("a,b/c,d(e,f)") into a nested dict.
+
+    A None value selects the whole field.
+    """
+
+    def parse_list(pos):
+        tree = {}
+        while pos < len(spec) and spec[pos] != ")":
+            end = pos
+            while end < len(spec) and spec[end] not in ",()":
+                end += 1
+            path = spec[pos:end].split("/")
+            pos = end
+            sub = None
+            if pos < len(spec) and spec[pos] == "(":
+                sub, pos = parse_list(pos + 1)
+                pos += 1  # Closing parenthesis
+            node = tree
+            for name in path[:-1]:
+                node = node.setdefault(name, {})
+            if sub is None or node.get(path[-1]) is None:
+                node[path[-1]] = sub
+            else:
+                node[path[-1]].update(sub)
+            if pos < len(spec) and spec[pos] == ",":
+                pos += 1
+        return tree, pos
+
+    return parse_list(0)[0]
+
+
+def apply_fields(tree, value):
+    """Keep only the selected fields of a decoded response, like the API does."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(tree, item) for item in value]
+    if isinstance(value, dict):
+        return {
+            name: apply_fields(sub, value[name])
+            for name, sub in tree.items()
+            if name in value
+        }
+    return value
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name + ".json"), "rb") as f:
+        return f.read()
+
+
+def masked_body(call):
+    fixture, fields = CALLS[call]
+    full = json.loads(load_fixture(fixture))
+    masked = apply_fields(parse_fields(fields), full)
+    # The API pretty-prints partial responses the same way as full ones
+    return json.dumps(masked, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def parse_seconds(body, min_time=0.2):
+    """Average json.loads() time of a body."""
+    loops = 0
+    start = time.perf_counter()
+    while True:
+        json.loads(body)
+        loops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / loops
+
+
+class FixtureClient:
+    """Stub API client answering every call from a fixture, masked or not."""
+
+    def __init__(self, masked):
+        self.masked = masked
+
+    def response(self, call):
+        body = masked_body(call) if self.masked else load_fixture(CALLS[call][0])
+        return FixtureRequest(json.loads(body))
+
+    def liveBroadcasts(self):
+        return self
+
+    def liveChatMessages(self):
+        return self
+
+    def videos(self):
+        return self
+
+    def list(self, **kwargs):
+        if "liveChatId" in kwargs:
+            return self.response("liveChatMessages.list")
+        if "broadcastStatus" in kwargs:
+            return self.response("liveBroadcasts.list-active")
+        if "snippet,contentDetails,status" == kwargs.get("part"):
+            return self.response("liveBroadcasts.list-settings")
+        if "statistics" in kwargs.get("part"):
+            return self.response("videos.list-counters")
+        return self.response("videos.list-metadata")
+
+    def update(self, **kwargs):
+        return self.response("liveBroadcasts.update")
+
+    def insert(self, **kwargs):
+        return self.response("liveChatMessages.insert")
+
+
+class FixtureRequest:
+    def __init__(self, body):
+        self.body = body
+        self.headers = {}
+
+    def execute(self, **kwargs):
+        return self.body
+
+
+def read_with_moderator(client):
+    """Everything the moderator reads from the responses of `client`."""
+    ym.video_metadata.clear()
+    ym.video_counters.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        streams = ym.get_active_stream_ids(client)
+        stats = ym.get_stream_statistics(client, streams[0][2])
+        ad_placement = ym.enable_auto_ad_placement(client, streams[0][1])
+
+        chat_response = ym.get_live_chat_messages(client, streams[0][0])
+        session = ym.ChatSession(*streams[0])
+        moderator_mode = ym.FEATURE_MODERATOR_ACTIVE
+        ym.FEATURE_MODERATOR_ACTIVE = ""  # Read the messages without moderating
+        try:
+            ym.process_chat_page(session, chat_response)
+        finally:
+            ym.FEATURE_MODERATOR_ACTIVE = moderator_mode
+        messages = [entry[:4] for entry in session.pending]
+        chat_paging = (
+            chat_response.get("nextPageToken"),
+            chat_response.get("pollingIntervalMillis"),
+        )
+    return {
+        "streams": streams,
+        "stats": stats,
+        "ad_placement": ad_placement,
+        "messages": messages,
+        "chat_paging": chat_paging,
+    }
+
+
+def run_benchmark():
+    report = {"calls": {}}
+    for name in CALLS:
+        full = load_fixture(CALLS[name][0])
+        masked = masked_body(name)
+        full_parse = parse_seconds(full)
+        masked_parse = parse_seconds(masked)
+        report["calls"][name] = {
+            "bytes": len(full),
+            "masked_bytes": len(masked),
+            "bytes_saved_pct": round(100 * (1 - len(masked) / len(full)), 1),
+            "parse_us": round(full_parse * 1e6, 1),
+            "masked_parse_us": round(masked_parse * 1e6, 1),
+            "parse_saved_pct": round(100 * (1 - masked_parse / full_parse), 1),
+        }
+
+    full_reads = read_with_moderator(FixtureClient(masked=False))
+    masked_reads = read_with_moderator(FixtureClient(masked=True))
+    report["masks_cover_reads"] = {
+        key: full_reads[key] == masked_reads[key] for key in full_reads
+    }
+    return report
+
+
+def record_fixtures():
+    """Save full responses of the read-only calls for the first live stream."""
+    youtube = ym.authenticate_youtube()
+    streams = ym.get_active_stream_ids(youtube)
+    if not streams:
+        print("A live stream is needed to record fixtures.")
+        return
+    live_chat_id, broadcast_id, video_id = streams[0]
+    requests = {
+        "liveBroadcasts.list-active": youtube.liveBroadcasts().list(
+            part="id,snippet", broadcastStatus="active", broadcastType="all", maxResults=50
+        ),
+        "liveChatMessages.list": youtube.liveChatMessages().list(
+            liveChatId=live_chat_id, part="snippet,authorDetails", maxResults=200
+        ),
+        "videos.list": youtube.videos().list(
+            part="liveStreamingDetails,statistics,snippet", id=video_id
+        ),
+        "liveBroadcasts.list-settings": youtube.liveBroadcasts().list(
+            id=broadcast_id, part="snippet,contentDetails,status"
+        ),
+    }
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, request in requests.items():
+        with open(os.path.join(FIXTURES_DIR, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(request.execute(), f, indent=2, ensure_ascii=False)
+        print(f"📼 Recorded {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare full and field-masked YouTube API responses."
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Re-record the read-only fixtures from the current live stream.",
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures()
+        return
+    print(json.dumps(run_benchmark(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
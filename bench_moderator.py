@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the moderator's hot functions, offline.
+
+Every benchmark runs a batch of operations several times, interleaved with
+the other benchmarks, and reports the median and best time per operation.
+Comparisons use the best time, which is the least disturbed by other
+processes:
+
+* login_check[N]: moderate_message_with_login() with N authorized users,
+  for logged-in authors, guests and chat moderators
+* dedupe: the processed message ID check and insert of a page, against a
+  full RecentIds of PROCESSED_IDS_LIMIT IDs
+* log_chat_message: one CSV row appended to a temporary chat log
+* parse_history_line / parse_pred_line: verify_moderator.py's parsers on
+  the lines of train_comments.txt
+* page_loop: process_chat_page() and apply_verdicts() on the recorded page in
+  bench_fixtures/, with a stub API client, per message
+* calibration: a fixed pure-Python loop, always run. Comparisons divide by
+  its change, so a machine that got slower or faster between two runs (CPU
+  frequency, noisy neighbours on a VM) does not look like a regression
+
+Nothing is sent over the network. Save the results and compare them with a
+run of another commit:
+
+    python bench_moderator.py --out before.json
+    python bench_moderator.py --compare before.json
+    python bench_moderator.py --filter login --repeat 9
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import youtube_moderator as ym
+import verify_moderator
+from bench_replay import FIXTURE, StubYouTube
+from moderation_checkpoint import RecentIds
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUTHORIZED_SET_SIZES = (1_000, 100_000, 1_000_000)
+
+
+def measure(benchmarks, repeat):
+    """
+    Time per operation of benchmarks {name: (run, operations)}.
+
+    The runs are interleaved, one of each benchmark per round, so a stretch
+    of time in which the machine is slow affects every benchmark alike.
+    """
+    timings = {name: [] for name in benchmarks}
+    for run, _ in benchmarks.values():
+        run()  # Warm up caches and lazy imports
+    gc.collect()
+    gc.disable()  # Like timeit: a collection must not land in one run only
+    try:
+        for _ in range(repeat):
+            for name, (run, operations) in benchmarks.items():
+                started = time.perf_counter()
+                run()
+                timings[name].append((time.perf_counter() - started) / operations)
+    finally:
+        gc.enable()
+    return {
+        name: {
+            "operations": benchmarks[name][1],
+            "median_ns": round(statistics.median(seconds) * 1e9, 1),
+            "best_ns": round(min(seconds) * 1e9, 1),
+        }
+        for name, seconds in timings.items()
+    }
+
+
+def bench_calibration():
+    def run():
+        total = 0
+        for i in range(200000):
+            total += i % 7
+        return total
+
+    return run, 200000
+
+
+def bench_login_check(size):
+    authorized = [f"UC{i:022d}" for i in range(size)]
+    authorized_users = set(authorized)
+    # Every 4th author is a guest, every 16th a chat moderator
+    items = []
+    for i in range(32768):
+        details = {"isChatOwner": False, "isChatModerator": i % 16 == 0}
+        user_id = f"UCguest{i:017d}" if i % 4 == 0 else authorized[i * 7919 % size]
+        items.append((user_id, f"message number {i}", {"authorDetails": details}))
+
+    def run():
+        ym.authorized_users = authorized_users
+        for user_id, text, item in items:
+            ym.moderate_message_with_login(user_id, text, item)
+
+    return run, len(items)
+
+
+def bench_dedupe():
+    processed = RecentIds(
+        ym.PROCESSED_IDS_LIMIT, (f"old-{i}" for i in range(ym.PROCESSED_IDS_LIMIT))
+    )
+    # Pages overlap by half, like consecutive polls of a busy chat
+    pages = [[f"id-{page * 40 + i}" for i in range(80)] for page in range(2000)]
+
+    def run():
+        for page in pages:
+            for message_id in page:
+                if message_id not in processed:
+                    processed.add(message_id)
+
+    return run, sum(len(page) for page in pages)
+
+
+def bench_log_chat_message(workdir):
+    path = os.path.join(workdir, "log_chat_message.log")
+    rows = [
+        (f"UC{i:022d}", f"user {i}", f"Сообщение номер {i}, with \"quotes\", and commas", i % 5 == 0)
+        for i in range(1000)
+    ]
+
+    def run():
+        ym.CHAT_LOG_FILE = path
+        for row in rows:
+            ym.log_chat_message(*row)
+        os.remove(path)
+
+    return run, len(rows)
+
+
+def read_history_lines():
+    with open(os.path.join(BASE_DIR, "train_comments.txt"), "r", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return lines * max(1, 20000 // len(lines))  # Long enough runs for stable timings
+
+
+def bench_parse_history_line():
+    lines = read_history_lines()
+
+    def run():
+        for line in lines:
+            verify_moderator.parse_history_line(line)
+
+    return run, len(lines)
+
+
+def bench_parse_pred_line():
+    lines = []
+    for line in read_history_lines():
+        text, label, _ = verify_moderator.parse_history_line(line)
+        lines.append(f"'{label}', '{text}'")
+
+    def run():
+        for line in lines:
+            verify_moderator.parse_pred_line(line)
+
+    return run, len(lines)
+
+
+def bench_page_loop(workdir):
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        page = json.load(f)
+    youtube = StubYouTube()
+    rounds = 20
+    round_counter = iter(range(10**9))
+
+    def run():
+        ym.CHAT_LOG_FILE = os.path.join(workdir, "page_loop.log")
+        for _ in range(rounds):
+            ym.authorized_users = set()
+            # Unique IDs per round so nothing is skipped as already processed
+            round_index = next(round_counter)
+            items = [{**item, "id": f"{round_index}-{item['id']}"} for item in page["items"]]
+            session = ym.ChatSession("bench-chat", "bench-broadcast", "bench-video")
+            ym.process_chat_page(session, {**page, "items": items})
+            while session.pending:
+                ym.apply_verdicts(youtube, session)
+
+    return run, rounds * len(page["items"])
+
+
+def run_benchmarks(name_filter, repeat):
+    workdir = tempfile.mkdtemp(prefix="bench_moderator_")
+    ym.FEATURE_MODERATOR_ACTIVE = "LOGIN"
+    ym.api_executor = ThreadPoolExecutor(ym.API_WORKERS)
+    ym.AUTHORIZED_USERS_FILE = os.path.join(workdir, "authorized_users.txt")
+    logging.disable(logging.CRITICAL)  # Measure the work, not the log output
+
+    benchmarks = {"calibration": bench_calibration}
+    for size in AUTHORIZED_SET_SIZES:
+        benchmarks[f"login_check[{size}]"] = lambda size=size: bench_login_check(size)
+    benchmarks.update(
+        {
+            "dedupe": bench_dedupe,
+            "log_chat_message": lambda: bench_log_chat_message(workdir),
+            "parse_history_line": bench_parse_history_line,
+            "parse_pred_line": bench_parse_pred_line,
+            "page_loop": lambda: bench_page_loop(workdir),
+        }
+    )
+    selected = {
+        name: setup()
+        for name, setup in benchmarks.items()
+        if not name_filter or name_filter in name or name == "calibration"
+    }
+    results = measure(selected, repeat)
+    for name, result in results.items():
+        print(f"{name:<26}{result['median_ns']:>14,.1f} ns/op", file=sys.stderr)
+    ym.api_executor.shutdown()
+    ym.authorized_users = set()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every benchmark. Returns the names that got slower than `threshold`."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    speed = 1.0
+    before = baseline["results"].get("calibration")
+    if before is not None:
+        speed = results["calibration"]["best_ns"] / before["best_ns"]
+        print(f"{'machine speed':<26}{speed - 1:>+13.1%}  (divided out below)", file=sys.stderr)
+    for name, result in results.items():
+        if name == "calibration":
+            continue
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<26}{'new':>14}", file=sys.stderr)
+            continue
+        # The best run is the least disturbed by other processes
+        change = result["best_ns"] / before["best_ns"] / speed - 1
+        flag = ""
+        if change > threshold:
+            flag = "  slower"
+            regressions.append(name)
+        print(f"{name:<26}{change:>+13.1%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the moderator's hot functions.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed runs per benchmark.")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--out", help="Write the JSON report to this file.")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare with.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.20,
+        help="Slowdown of the best run that counts as a regression (exit status 1).",
+    )
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": run_benchmarks(args.filter, args.repeat),
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report["results"], baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
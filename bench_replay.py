@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded chat page through the moderation path and measure the cost
+of logging.
+
+The page in bench_fixtures/liveChatMessages.list.json is fed through
+process_chat_page() and apply_verdicts() of youtube_moderator.py with a stub
+API client (deletes succeed instantly) and, in LLM mode, a stub LLM. Each
+logging setup is timed while writing to a sink that takes --sink-latency-ms per
+write, like a slow terminal or journald:
+
+* sync-debug: every line written synchronously, like the old print() calls
+* off: logging disabled, the floor for the moderation work itself
+* queue-info / queue-debug: the moderator's queued, sampled logging
+
+    python bench_replay.py
+    python bench_replay.py --mode llm --rounds 50 --sink-latency-ms 1
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import youtube_moderator as ym
+from moderation_logging import LOG_FORMAT, ContextFormatter, setup_logging
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "bench_fixtures",
+    "liveChatMessages.list.json",
+)
+
+
+class SlowSink:
+    """Text stream whose writes take a fixed time."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class StubRequest:
+    def execute(self, **kwargs):
+        return {}
+
+
+class StubYouTube:
+    """Accepts deletes without doing anything."""
+
+    def liveChatMessages(self):
+        return self
+
+    def delete(self, **kwargs):
+        return StubRequest()
+
+
+class StubLLMResponse:
+    def __init__(self, decision):
+        self.decision = decision
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.decision}}]}
+
+
+def stub_llm(url, json=None, **kwargs):
+    text = json["messages"][-1]["content"]
+    return StubLLMResponse("DELETE" if "росси" in text.lower() else "KEEP")
+
+
+def replay(page, rounds):
+    """Moderate `rounds` copies of the page. Returns (seconds, messages)."""
+    youtube = StubYouTube()
+    messages = 0
+    start = time.perf_counter()
+    for round_index in range(rounds):
+        ym.authorized_users.clear()
+        ym.verdict_cache = ym.VerdictCache(ym.VERDICT_CACHE_SIZE)
+        # Unique IDs per round so nothing is skipped as already processed
+        items = [{**item, "id": f"{round_index}-{item['id']}"} for item in page["items"]]
+        session = ym.ChatSession("replay-chat", "replay-broadcast", "replay-video")
+        ym.process_chat_page(session, {**page, "items": items})
+        while session.pending:
+            ym.apply_verdicts(youtube, session)
+            if session.pending:
+                time.sleep(0.0005)
+        messages += len(items)
+    return time.perf_counter() - start, messages
+
+
+def configure_sync(sink, level):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(ContextFormatter(LOG_FORMAT, datefmt="%H:%M:%S"))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def run_scenario(name, page, rounds, sink_latency):
+    sink = SlowSink(sink_latency)
+    listener = queue_handler = None
+    if name == "sync-debug":
+        configure_sync(sink, logging.DEBUG)
+    elif name == "off":
+        configure_sync(sink, logging.CRITICAL)
+    else:
+        level = "DEBUG" if name == "queue-debug" else "INFO"
+        listener, queue_handler = setup_logging(
+            level, ym.LOG_DEBUG_SAMPLE_EVERY, ym.LOG_QUEUE_SIZE, stream=sink
+        )
+
+    elapsed, messages = replay(page, rounds)
+    result = {
+        "messages": messages,
+        "messages_per_second": round(messages / elapsed, 1),
+        "us_per_message": round(elapsed / messages * 1e6, 1),
+    }
+    if listener is not None:
+        started = time.perf_counter()
+        listener.stop()
+        result["drain_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["dropped"] = queue_handler.dropped
+    result["lines_written"] = sink.writes
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure logging overhead on a replayed chat page."
+    )
+    parser.add_argument("--mode", choices=["LOGIN", "LLM"], default="LOGIN", type=str.upper)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--sink-latency-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        page = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="bench_replay_")
+    ym.CHAT_LOG_FILE = os.path.join(workdir, "chat_messages.log")
+    ym.AUTHORIZED_USERS_FILE = os.path.join(workdir, "authorized_users.txt")
+    ym.FEATURE_MODERATOR_ACTIVE = args.mode
+    ym.api_executor = ThreadPoolExecutor(ym.API_WORKERS)
+    if args.mode == "LLM":
+        requests.post = stub_llm
+        ym.classification_pool = ym.ClassificationPool(ym.CLASSIFICATION_WORKERS)
+
+    report = {
+        "mode": args.mode,
+        "page_messages": len(page["items"]),
+        "rounds": args.rounds,
+        "sink_latency_ms": args.sink_latency_ms,
+        "scenarios": {},
+    }
+    for name in ("sync-debug", "off", "queue-info", "queue-debug"):
+        report["scenarios"][name] = run_scenario(
+            name, page, args.rounds, args.sink_latency_ms / 1000
+        )
+    floor = report["scenarios"]["off"]["us_per_message"]
+    for result in report["scenarios"].values():
+        result["logging_overhead_us_per_message"] = round(
+            result["us_per_message"] - floor, 1
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Track how long youtube_moderator.py takes to start.
+
+Every measurement runs in a fresh interpreter, so nothing is already
+imported or cached:
+
+* interpreter: `python -c pass`, the floor for any script;
+* import: `import youtube_moderator`;
+* ready: import, logging, authorized users, YouTube client built from the
+  bundled discovery document and checkpoint loaded: everything before the
+  first API request. Credentials are a dummy token, so no network is used.
+
+The slowest top-level imports of the "ready" run are listed to show where
+the remaining time goes.
+
+    python bench_startup.py
+    python bench_startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+READY_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import youtube_moderator as ym
+imported = time.perf_counter()
+listener, _ = ym.setup_logging("WARNING")
+ym.load_authorized_users()
+from google.oauth2.credentials import Credentials
+youtube = ym.build_youtube(Credentials(token="bench-startup"))
+built = time.perf_counter()
+ym.ModerationCheckpoint(ym.CHECKPOINT_FILE, ym.CHECKPOINT_MAX_AGE_SECONDS).load()
+ready = time.perf_counter()
+listener.stop()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "client_ms": (built - imported) * 1000,
+    "checkpoint_ms": (ready - built) * 1000,
+    "ready_ms": (ready - start) * 1000,
+}))
+"""
+
+
+def run_python(args):
+    """Run a fresh interpreter in the package directory."""
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=PACKAGE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def wall_ms(args, runs):
+    """Median wall time of a fresh interpreter running `args`."""
+    samples = []
+    for _ in range(runs):
+        result = run_python(
+            ["-c", "import subprocess, sys, time; start = time.perf_counter(); "
+             "subprocess.run([sys.executable] + sys.argv[1:], check=True); "
+             "print((time.perf_counter() - start) * 1000)"]
+            + args
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(samples), 1)
+
+
+def slowest_imports(stderr, count=8):
+    """Top-level modules with the largest cumulative -X importtime."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # Header line
+        name = fields[2]
+        if name.startswith("  "):
+            continue  # Imported by another module
+        imports.append((int(fields[1]), name.strip()))
+    imports.sort(reverse=True)
+    return {name: round(us / 1000, 1) for us, name in imports[:count]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure moderator cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    phases = []
+    for _ in range(args.runs):
+        result = run_python(["-c", READY_SNIPPET])
+        phases.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    profile = run_python(["-X", "importtime", "-c", READY_SNIPPET])
+
+    report = {
+        "runs": args.runs,
+        "wall_ms": {
+            "interpreter": wall_ms(["-c", "pass"], args.runs),
+            "import": wall_ms(["-c", "import youtube_moderator"], args.runs),
+            "ready": wall_ms(["-c", READY_SNIPPET], args.runs),
+        },
+        "in_process_ms": {
+            key: round(statistics.median(run[key] for run in phases), 1)
+            for key in phases[0]
+        },
+        "slowest_imports_ms": slowest_imports(profile.stderr),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Searchable archive of every moderated chat message.
+
+chat_messages.log only records author, text and is_removed. The archive adds
+the stream, message ID, publish time and verdict of each message. It is an
+SQLite database:
+
+* streams: one row per live chat, with start/end time and running message and
+  deletion counters, so per-stream totals need no scan;
+* messages: every moderated message. Every index starts with the stream, the
+  author or the time, so lookups stay logarithmic at tens of millions of rows;
+* messages_fts: FTS5 full-text index of the message texts.
+
+The moderator only puts messages on a queue. A background thread writes them
+in batches, one transaction per batch, so archiving never waits for the disk.
+
+Query it from the command line:
+
+    python moderation_archive.py streams
+    python moderation_archive.py author UCxxxx --since 7d
+    python moderation_archive.py search "scam OR http*" --removed
+    python moderation_archive.py stream-stats            # latest stream
+"""
+
+import argparse
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger("youtube_moderator.archive")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    stream_id INTEGER PRIMARY KEY,
+    live_chat_id TEXT NOT NULL UNIQUE,
+    broadcast_id TEXT,
+    video_id TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS streams_started ON streams (started_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    stream_id INTEGER NOT NULL REFERENCES streams (stream_id),
+    message_id TEXT NOT NULL,
+    published_at REAL NOT NULL,
+    author_id TEXT NOT NULL,
+    author_name TEXT,
+    text TEXT NOT NULL,
+    decision TEXT,
+    removed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_stream_time ON messages (stream_id, published_at);
+CREATE INDEX IF NOT EXISTS messages_author_time ON messages (author_id, published_at);
+CREATE INDEX IF NOT EXISTS messages_time ON messages (published_at);
+CREATE INDEX IF NOT EXISTS messages_removed ON messages (stream_id, published_at) WHERE removed;
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+
+def connect(path, timeout=30):
+    db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    # WAL: queries and cluster workers can read while a batch is written
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class ChatArchive:
+    """Queues archive writes for a background thread that stores them in batches."""
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, queue_size=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="archive", daemon=True)
+        self.thread.start()
+
+    def start_stream(self, live_chat_id, broadcast_id, video_id):
+        self._put(("start", live_chat_id, broadcast_id, video_id, time.time()))
+
+    def end_stream(self, live_chat_id):
+        self._put(("end", live_chat_id, time.time()))
+
+    def add(self, live_chat_id, message_id, published_at, author_id, author_name, text, decision, removed):
+        """Archive one moderated message. Never blocks."""
+        self._put(
+            ("message", live_chat_id, message_id, published_at, author_id, author_name, text, decision, removed)
+        )
+
+    def close(self):
+        """Write out everything queued and stop the writer."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            db = connect(self.path)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Cannot open chat archive, archiving disabled: {e}")
+            while self.queue.get() is not None:
+                pass
+            return
+        stream_ids = {}  # live_chat_id -> stream_id
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                self._write(db, batch, stream_ids)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Failed to archive {len(batch)} chat events: {e}")
+        db.close()
+
+    def _write(self, db, batch, stream_ids):
+        counts = {}  # stream_id -> [messages, removed]
+        rows = []
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for item in batch:
+                kind, live_chat_id = item[0], item[1]
+                if kind == "start":
+                    _, _, broadcast_id, video_id, started_at = item
+                    db.execute(
+                        "INSERT INTO streams (live_chat_id, broadcast_id, video_id, started_at)"
+                        " VALUES (?, ?, ?, ?) ON CONFLICT (live_chat_id) DO UPDATE SET ended_at = NULL",
+                        (live_chat_id, broadcast_id, video_id, started_at),
+                    )
+                elif kind == "end":
+                    db.execute(
+                        "UPDATE streams SET ended_at = ? WHERE live_chat_id = ?",
+                        (item[2], live_chat_id),
+                    )
+                else:
+                    stream_id = stream_ids.get(live_chat_id)
+                    if stream_id is None:
+                        stream_id = stream_ids[live_chat_id] = self._stream_id(db, live_chat_id)
+                    _, _, message_id, published_at, author_id, author_name, text, decision, removed = item
+                    rows.append(
+                        (stream_id, message_id, published_at, author_id, author_name, text, decision, int(removed))
+                    )
+                    count = counts.setdefault(stream_id, [0, 0])
+                    count[0] += 1
+                    count[1] += int(removed)
+            db.executemany(
+                "INSERT INTO messages (stream_id, message_id, published_at, author_id,"
+                " author_name, text, decision, removed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.executemany(
+                "UPDATE streams SET messages = messages + ?, removed = removed + ? WHERE stream_id = ?",
+                [(messages, removed, stream_id) for stream_id, (messages, removed) in counts.items()],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self.written += len(rows)
+
+    def _stream_id(self, db, live_chat_id):
+        """Stream of a chat, created if messages arrive before its start event."""
+        row = db.execute(
+            "SELECT stream_id FROM streams WHERE live_chat_id = ?", (live_chat_id,)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        return db.execute(
+            "INSERT INTO streams (live_chat_id, started_at) VALUES (?, ?)",
+            (live_chat_id, time.time()),
+        ).lastrowid
+
+
+## QUERY CLI ####################################################################
+
+
+def parse_since(value):
+    """Unix time from an ISO date/time or a relative age such as 30m, 12h or 7d."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
+
+
+def print_messages(rows):
+    for published_at, live_chat_id, author_id, author_name, text, removed in rows:
+        mark = "🗑️" if removed else "  "
+        print(f"{format_time(published_at)} {mark} {live_chat_id} {author_name} ({author_id}): {text}")
+
+
+def message_filters(args, where, params):
+    if getattr(args, "stream", None):
+        where.append("m.stream_id = (SELECT stream_id FROM streams WHERE live_chat_id = ?)")
+        params.append(args.stream)
+    if getattr(args, "since", None):
+        where.append("m.published_at >= ?")
+        params.append(parse_since(args.since))
+    if getattr(args, "removed", False):
+        where.append("m.removed")
+
+
+MESSAGE_COLUMNS = "m.published_at, s.live_chat_id, m.author_id, m.author_name, m.text, m.removed"
+
+
+def command_streams(db, args):
+    rows = db.execute(
+        "SELECT live_chat_id, video_id, started_at, ended_at, messages, removed"
+        " FROM streams ORDER BY started_at DESC LIMIT ?",
+        (args.limit,),
+    ).fetchall()
+    for live_chat_id, video_id, started_at, ended_at, messages, removed in rows:
+        print(
+            f"{format_time(started_at)} - {format_time(ended_at)}  {live_chat_id}  "
+            f"video={video_id}  messages={messages}  removed={removed}"
+        )
+
+
+def command_stream_stats(db, args):
+    if args.stream:
+        row = db.execute(
+            "SELECT stream_id, live_chat_id, started_at, ended_at, messages, removed"
+            " FROM streams WHERE live_chat_id = ?",
+            (args.stream,),
+        ).fetchone()
+    else:
+        row = db.execute(
+            "SELECT stream_id, live_chat_id, started_at, ended_at, messages, removed"
+            " FROM streams ORDER BY started_at DESC LIMIT 1"
+        ).fetchone()
+    if row is None:
+        print("No such stream.")
+        return
+    stream_id, live_chat_id, started_at, ended_at, messages, removed = row
+    authors = db.execute(
+        "SELECT COUNT(DISTINCT author_id) FROM messages WHERE stream_id = ?", (stream_id,)
+    ).fetchone()[0]
+    print(f"Stream {live_chat_id}: {format_time(started_at)} - {format_time(ended_at)}")
+    print(f"  messages: {messages}, removed: {removed}, authors: {authors}")
+    for author_id, author_name, count in db.execute(
+        "SELECT author_id, MAX(author_name), COUNT(*) AS n FROM messages"
+        " WHERE stream_id = ? AND removed GROUP BY author_id ORDER BY n DESC LIMIT ?",
+        (stream_id, args.limit),
+    ):
+        print(f"  {count:6} removed  {author_name} ({author_id})")
+
+
+def command_author(db, args):
+    where, params = ["m.author_id = ?"], [args.author_id]
+    message_filters(args, where, params)
+    print_messages(
+        db.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages m JOIN streams s USING (stream_id)"
+            f" WHERE {' AND '.join(where)} ORDER BY m.published_at DESC LIMIT ?",
+            params + [args.limit],
+        )
+    )
+
+
+def command_search(db, args):
+    where, params = ["messages_fts MATCH ?"], [args.query]
+    message_filters(args, where, params)
+    print_messages(
+        db.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages_fts"
+            " JOIN messages m ON m.id = messages_fts.rowid JOIN streams s USING (stream_id)"
+            f" WHERE {' AND '.join(where)} ORDER BY m.published_at DESC LIMIT ?",
+            params + [args.limit],
+        )
+    )
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default="chat_archive.db")
+    common.add_argument("--limit", type=int, default=50)
+    parser = argparse.ArgumentParser(description="Query the chat archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "streams", parents=[common], help="Latest streams with message and removal counts."
+    )
+
+    stream_stats = commands.add_parser(
+        "stream-stats", parents=[common], help="Totals and most removed authors of a stream."
+    )
+    stream_stats.add_argument("--stream", help="Live chat ID (default: the latest stream).")
+
+    author = commands.add_parser(
+        "author", parents=[common], help="Messages of one author, newest first."
+    )
+    author.add_argument("author_id")
+
+    search = commands.add_parser(
+        "search", parents=[common], help="Full-text search (FTS5 query syntax)."
+    )
+    search.add_argument("query")
+
+    for command in (author, search):
+        command.add_argument("--stream", help="Only this live chat ID.")
+        command.add_argument("--since", help="ISO time or age such as 30m, 12h, 7d.")
+        command.add_argument("--removed", action="store_true", help="Only removed messages.")
+
+    args = parser.parse_args()
+    db = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    started = time.perf_counter()
+    {
+        "streams": command_streams,
+        "stream-stats": command_stream_stats,
+        "author": command_author,
+        "search": command_search,
+    }[args.command](db, args)
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Crash-safe checkpoints of the per-chat moderation state.
+
+The moderator periodically writes the page cursor, recently handled message
+IDs, messages still waiting for a verdict and the promo/ad-break/stats timers
+of every chat to one JSON file. The file is replaced atomically (write to a
+temporary file, fsync, rename), so a crash leaves either the old or the new
+checkpoint, never a torn one. After a restart a chat that is still live
+resumes from its checkpoint instead of re-reading the whole backlog.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger("youtube_moderator.checkpoint")
+
+
+class RecentIds:
+    """Set of the most recently added IDs, forgetting the oldest past `limit`."""
+
+    def __init__(self, limit, ids=()):
+        self.limit = limit
+        self.ids = set()
+        self.order = deque()
+        for item_id in ids:
+            self.add(item_id)
+
+    def __contains__(self, item_id):
+        return item_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def add(self, item_id):
+        if item_id in self.ids:
+            return
+        self.ids.add(item_id)
+        self.order.append(item_id)
+        if len(self.order) > self.limit:
+            self.ids.discard(self.order.popleft())
+
+
+class ModerationCheckpoint:
+    """Loads and atomically rewrites the checkpoint file."""
+
+    def __init__(self, path, max_age):
+        """
+        Args:
+            path: checkpoint file
+            max_age: seconds after which a saved chat is no longer resumed
+        """
+        self.path = path
+        self.max_age = max_age
+        self.restored = {}  # live_chat_id -> state not yet claimed by a session
+
+    def load(self):
+        """Read the last checkpoint. Returns the number of chats it holds."""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable moderation checkpoint: {e}")
+            return 0
+        oldest = time.time() - self.max_age
+        self.restored = {
+            live_chat_id: state
+            for live_chat_id, state in checkpoint.get("chats", {}).items()
+            if state.get("saved_at", 0) >= oldest
+        }
+        return len(self.restored)
+
+    def take(self, live_chat_id):
+        """Saved state of a chat, or None. Each chat is resumed only once."""
+        return self.restored.pop(live_chat_id, None)
+
+    def save(self, states):
+        """
+        Replace the checkpoint with the given chats.
+
+        Args:
+            states: live_chat_id -> JSON-serializable state with "saved_at"
+        """
+        # Keep chats from the previous run that are not live again yet, in
+        # case discovery has not found them so far
+        oldest = time.time() - self.max_age
+        chats = {
+            live_chat_id: state
+            for live_chat_id, state in self.restored.items()
+            if state.get("saved_at", 0) >= oldest
+        }
+        chats.update(states)
+
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "chats": chats}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to write moderation checkpoint: {e}")
+            return False
+        return True
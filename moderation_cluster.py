@@ -0,0 +1,269 @@
+"""
+Shared state for running the moderator as several processes.
+
+A coordinator process finds the live chats and assigns each one to a worker
+process. Workers moderate only the chats assigned to them. Everything the
+processes share lives in one SQLite database, which stands in for a broker:
+
+* workers: worker IDs and their last heartbeat;
+* assignments: every live chat and the worker moderating it;
+* authorized_users: users who wrote the login phrase in any chat;
+* claimed_messages: message IDs taken by a worker, so a chat that moves to
+  another worker is not moderated twice. A claim is done once the verdict
+  was applied; claims that are not done are released when the worker drops
+  the message (its chat moved away) or dies, so the next worker moderates it.
+
+A worker whose heartbeat is older than the timeout is treated as dead, and
+its chats go to the remaining workers. Chats are also moved when a new worker
+joins, so adding workers adds capacity.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    live_chat_id TEXT PRIMARY KEY,
+    broadcast_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    worker_id TEXT,
+    started INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS assignments_worker ON assignments (worker_id);
+CREATE TABLE IF NOT EXISTS authorized_users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS claimed_messages (
+    message_id TEXT PRIMARY KEY,
+    claimed_at REAL NOT NULL,
+    worker_id TEXT,
+    done INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS claimed_messages_time ON claimed_messages (claimed_at);
+"""
+
+# Stores created before claims had an owner; their claims all count as done
+CLAIM_OWNER_COLUMNS = (
+    "ALTER TABLE claimed_messages ADD COLUMN worker_id TEXT",
+    "ALTER TABLE claimed_messages ADD COLUMN done INTEGER NOT NULL DEFAULT 1",
+)
+
+
+class ClusterStore:
+    """Assignments, heartbeats and shared moderation state in SQLite."""
+
+    def __init__(self, path, timeout=10):
+        self.path = path
+        # Autocommit mode; multi-statement changes use transaction()
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        # WAL lets workers read while another process writes
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(claimed_messages)")}
+        if "worker_id" not in columns:
+            for statement in CLAIM_OWNER_COLUMNS:
+                self.db.execute(statement)
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS claimed_messages_open "
+            "ON claimed_messages (worker_id) WHERE NOT done"
+        )
+
+    @contextmanager
+    def transaction(self):
+        """Take the database write lock up front so read-modify-write is atomic."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    ## WORKERS ##################################################################
+
+    def heartbeat(self, worker_id, now=None):
+        """Register the worker or refresh its heartbeat."""
+        self.db.execute(
+            "INSERT INTO workers (worker_id, heartbeat) VALUES (?, ?) "
+            "ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+            (worker_id, time.time() if now is None else now),
+        )
+
+    def remove_worker(self, worker_id):
+        """Forget a worker that stopped and release its chats and unfinished claims."""
+        with self.transaction() as db:
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            db.execute(
+                "UPDATE assignments SET worker_id = NULL WHERE worker_id = ?",
+                (worker_id,),
+            )
+            db.execute(
+                "DELETE FROM claimed_messages WHERE worker_id = ? AND NOT done",
+                (worker_id,),
+            )
+
+    def assigned_streams(self, worker_id):
+        """(live chat ID, broadcast ID, video ID) of the worker's chats."""
+        rows = self.db.execute(
+            "SELECT live_chat_id, broadcast_id, video_id FROM assignments "
+            "WHERE worker_id = ? ORDER BY live_chat_id",
+            (worker_id,),
+        )
+        return [tuple(row) for row in rows]
+
+    ## COORDINATOR ##############################################################
+
+    def set_streams(self, streams):
+        """Replace the set of live chats with the result of a discovery."""
+        with self.transaction() as db:
+            live_chat_ids = [stream_ids[0] for stream_ids in streams]
+            db.execute(
+                "DELETE FROM assignments WHERE live_chat_id NOT IN (%s)"
+                % ",".join("?" * len(live_chat_ids)),
+                live_chat_ids,
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO assignments (live_chat_id, broadcast_id, video_id) "
+                "VALUES (?, ?, ?)",
+                streams,
+            )
+
+    def rebalance(self, worker_timeout, now=None):
+        """
+        Drop dead workers and spread the chats evenly over the live ones.
+
+        Returns:
+            tuple: (IDs of dead workers, list of (live chat ID, new worker ID))
+        """
+        now = time.time() if now is None else now
+        with self.transaction() as db:
+            dead = [
+                row[0]
+                for row in db.execute(
+                    "SELECT worker_id FROM workers WHERE heartbeat < ?",
+                    (now - worker_timeout,),
+                )
+            ]
+            db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - worker_timeout,))
+            db.executemany(
+                "DELETE FROM claimed_messages WHERE worker_id = ? AND NOT done",
+                [(worker_id,) for worker_id in dead],
+            )
+
+            load = {row[0]: [] for row in db.execute("SELECT worker_id FROM workers")}
+            unassigned = []
+            for live_chat_id, worker_id in db.execute(
+                "SELECT live_chat_id, worker_id FROM assignments ORDER BY live_chat_id"
+            ):
+                if worker_id in load:
+                    load[worker_id].append(live_chat_id)
+                else:
+                    unassigned.append(live_chat_id)
+            if not load:
+                return dead, []
+
+            moves = []
+            for live_chat_id in unassigned:
+                worker_id = min(load, key=lambda w: len(load[w]))
+                load[worker_id].append(live_chat_id)
+                moves.append((live_chat_id, worker_id))
+            # Move chats off the busiest worker until loads differ by at most one
+            while True:
+                busiest = max(load, key=lambda w: len(load[w]))
+                idlest = min(load, key=lambda w: len(load[w]))
+                if len(load[busiest]) - len(load[idlest]) <= 1:
+                    break
+                live_chat_id = load[busiest].pop()
+                load[idlest].append(live_chat_id)
+                moves.append((live_chat_id, idlest))
+
+            db.executemany(
+                "UPDATE assignments SET worker_id = ? WHERE live_chat_id = ?",
+                [(worker_id, live_chat_id) for live_chat_id, worker_id in moves],
+            )
+            return dead, moves
+
+    def mark_started(self, live_chat_id):
+        """True only for the first worker to start moderating the chat."""
+        cursor = self.db.execute(
+            "UPDATE assignments SET started = 1 WHERE live_chat_id = ? AND started = 0",
+            (live_chat_id,),
+        )
+        return cursor.rowcount == 1
+
+    ## SHARED MODERATION STATE ##################################################
+
+    def is_authorized(self, user_id):
+        row = self.db.execute(
+            "SELECT 1 FROM authorized_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row is not None
+
+    def add_authorized_users(self, user_ids):
+        self.db.executemany(
+            "INSERT OR IGNORE INTO authorized_users (user_id) VALUES (?)",
+            [(user_id,) for user_id in user_ids],
+        )
+
+    def claim_messages(self, message_ids, worker_id, now=None):
+        """
+        Take messages for moderation by `worker_id`. Unfinished claims the
+        worker already holds, e.g. from before a restart, count as claimed.
+
+        Returns:
+            tuple: (set of IDs claimed by this worker, set of IDs another
+            worker claimed but has not finished yet)
+        """
+        now = time.time() if now is None else now
+        claimed = set()
+        with self.transaction() as db:
+            for message_id in message_ids:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO claimed_messages "
+                    "(message_id, claimed_at, worker_id, done) VALUES (?, ?, ?, 0)",
+                    (message_id, now, worker_id),
+                )
+                if cursor.rowcount == 1:
+                    claimed.add(message_id)
+            others = [message_id for message_id in message_ids if message_id not in claimed]
+            unfinished = set()
+            if others:
+                for message_id, owner in db.execute(
+                    "SELECT message_id, worker_id FROM claimed_messages WHERE NOT done "
+                    "AND message_id IN (%s)" % ",".join("?" * len(others)),
+                    others,
+                ):
+                    if owner == worker_id:
+                        claimed.add(message_id)
+                    else:
+                        unfinished.add(message_id)
+        return claimed, unfinished
+
+    def finish_claims(self, message_ids):
+        """The verdicts of these claimed messages were applied."""
+        with self.transaction() as db:
+            db.executemany(
+                "UPDATE claimed_messages SET done = 1 WHERE message_id = ?",
+                [(message_id,) for message_id in message_ids],
+            )
+
+    def release_claims(self, message_ids):
+        """Give up unfinished claims, so another worker can moderate the messages."""
+        with self.transaction() as db:
+            db.executemany(
+                "DELETE FROM claimed_messages WHERE message_id = ? AND NOT done",
+                [(message_id,) for message_id in message_ids],
+            )
+
+    def prune_claims(self, max_age, now=None):
+        """Forget handled message IDs older than `max_age` seconds."""
+        now = time.time() if now is None else now
+        self.db.execute(
+            "DELETE FROM claimed_messages WHERE claimed_at < ?", (now - max_age,)
+        )
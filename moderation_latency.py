@@ -0,0 +1,137 @@
+"""
+End-to-end moderation latency of each live chat.
+
+Every message carries a MessageTiming: when YouTube says it was published
+(snippet.publishedAt), when the moderator fetched it, when its verdict was
+ready and, for removed messages, when the delete was confirmed. The stages
+are added to fixed-bucket histograms per stream:
+
+* fetch: published -> fetched, the polling delay
+* classify: fetched -> verdict, queueing plus the LLM or login check
+* delete: verdict -> delete confirmed
+* decision: published -> verdict, for every message
+* exposure: published -> delete confirmed, how long a removed message was visible
+
+One set of histograms covers the current report interval and is reset after
+each report, another covers the whole stream and is written as a summary when
+the stream ends.
+"""
+
+import bisect
+import time
+from dataclasses import dataclass
+
+# Bucket upper bounds in seconds: 50 ms to about 4 hours, 20% apart
+BUCKETS = [0.05 * 1.2**i for i in range(63)]
+STAGES = ("fetch", "classify", "delete", "decision", "exposure")
+
+
+class LatencyHistogram:
+    """Counts of latencies per bucket; percentiles are read from the buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        seconds = max(0.0, seconds)  # publishedAt comes from YouTube's clock
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                bound = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3),
+            "p50": round(self.percentile(0.50), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+@dataclass
+class MessageTiming:
+    """Unix timestamps of one message on its way through the moderator."""
+
+    published_at: float
+    fetched_at: float
+    verdict_at: float = None
+    deleted_at: float = None
+    # Details for the per-message trace spans (moderation_tracing)
+    poll_started_at: float = None
+    classifier: str = None  # "rule", "cache", "llm", "skip" or None
+    classify_started_at: float = None  # An LLM worker took the message
+    delete_started_at: float = None
+    skipped: str = None  # Why load shedding skipped it (moderation_overload)
+
+    def mark_verdict(self, future):
+        """Future callback: the verdict is ready."""
+        self.verdict_at = time.time()
+
+    def mark_deleted(self, future):
+        """Future callback: the delete call returned."""
+        self.deleted_at = time.time()
+
+
+class StreamLatency:
+    """Latency histograms of one stream."""
+
+    def __init__(self, live_chat_id, video_id):
+        self.live_chat_id = live_chat_id
+        self.video_id = video_id
+        self.started_at = time.time()
+        self.window = {stage: LatencyHistogram() for stage in STAGES}
+        self.total = {stage: LatencyHistogram() for stage in STAGES}
+
+    def record(self, timing, is_removed):
+        """Add a moderated message whose verdict (and delete) has completed."""
+        # Future callbacks run just after the waiters wake up, so a stamp can
+        # still be missing; it is then at most a moment in the past
+        now = time.time()
+        verdict_at = timing.verdict_at or now
+        stages = {
+            "fetch": timing.fetched_at - timing.published_at,
+            "classify": verdict_at - timing.fetched_at,
+            "decision": verdict_at - timing.published_at,
+        }
+        if is_removed:
+            deleted_at = timing.deleted_at or now
+            stages["delete"] = deleted_at - verdict_at
+            stages["exposure"] = deleted_at - timing.published_at
+        for stage, seconds in stages.items():
+            self.window[stage].add(seconds)
+            self.total[stage].add(seconds)
+
+    def take_window(self):
+        """Summaries of the current interval, which then starts over."""
+        window, self.window = self.window, {stage: LatencyHistogram() for stage in STAGES}
+        return {stage: histogram.summary() for stage, histogram in window.items()}
+
+    def summary(self):
+        """Summary of the whole stream so far."""
+        return {
+            "live_chat_id": self.live_chat_id,
+            "video_id": self.video_id,
+            "started_at": self.started_at,
+            "ended_at": time.time(),
+            "stages": {stage: histogram.summary() for stage, histogram in self.total.items()},
+        }
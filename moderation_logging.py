@@ -0,0 +1,101 @@
+"""
+Non-blocking logging for the moderator.
+
+Log calls only put the record on a bounded in-memory queue. A background
+listener formats the records and writes them to stdout, so a slow terminal,
+pipe or journald never stalls the moderation loop. If the writer falls too far
+behind, new records are dropped and counted instead of blocking.
+
+Per-message debug lines are sampled: only one in `debug_sample_every` records
+logged with extra={"sample": True} is kept. Context such as the chat or
+message ID is passed with extra={"context": {...}} and printed as key=value
+pairs after the message.
+"""
+
+import itertools
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(message)s%(context)s"
+
+
+class SampleFilter(logging.Filter):
+    """Keep one in `every` sampled debug records; pass everything else."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if getattr(record, "sample", False) and record.levelno <= logging.DEBUG:
+            return next(self.counter) % self.every == 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread; the records only cross
+        # threads, so they do not need to be made picklable here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue."""
+
+    def enqueue_sentinel(self):
+        # The base class uses put_nowait(), which raises on a full queue; the
+        # listener thread is still draining it, so a blocking put succeeds
+        self.queue.put(self._sentinel)
+
+
+class ContextFormatter(logging.Formatter):
+    """Appends the record's context dict as key=value pairs."""
+
+    def format(self, record):
+        context = getattr(record, "context", None)
+        record.context = (
+            " " + " ".join(f"{key}={value}" for key, value in context.items())
+            if context
+            else ""
+        )
+        return super().format(record)
+
+
+def setup_logging(level="INFO", debug_sample_every=100, queue_size=10000, stream=None):
+    """
+    Route all logging through a queue to a background writer.
+
+    Returns:
+        tuple: (QueueListener to stop() on shutdown, DroppingQueueHandler)
+    """
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SampleFilter(debug_sample_every))
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(ContextFormatter(LOG_FORMAT, datefmt="%H:%M:%S"))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = DrainingQueueListener(log_queue, writer)
+    listener.start()
+    return listener, handler
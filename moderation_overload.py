@@ -0,0 +1,174 @@
+"""
+Load shedding when chat messages arrive faster than the LLM can classify them.
+
+Without it the classification backlog just grows: verdicts arrive minutes
+late, when deleting the message no longer protects anyone, and every late
+verdict still costs an LLM request. The controller watches the backlog of the
+classification pool and how long messages wait in it, and switches between
+three levels:
+
+* normal: every message not in the verdict cache goes to the LLM;
+* sampling: only risky messages and a `sample_rate` share of the others go
+  to the LLM, the rest are skipped;
+* cache-only: only verdicts already in the cache are applied.
+
+It escalates as soon as a threshold is crossed, but steps down only one level
+at a time, after the backlog and the queue wait stayed low for
+`recover_seconds`, so it does not flap around a threshold.
+
+Messages already queued are still classified when the level rises, so the
+workers keep draining the backlog. But at a degraded level, a message older
+than `max_age` is skipped, both when it is queued and when a worker takes it
+from the queue. In normal mode every message is classified, however old: the
+first page of a new chat, messages from a restart or an outage and resumed
+checkpoints must not be left unmoderated while the LLM is idle.
+"""
+
+import logging
+import random
+import threading
+from collections import Counter
+
+logger = logging.getLogger("youtube_moderator.overload")
+
+NORMAL, SAMPLING, CACHE_ONLY = 0, 1, 2
+LEVEL_NAMES = ("normal", "sampling", "cache-only")
+
+
+class OverloadController:
+    """Decides which messages are classified while the LLM cannot keep up."""
+
+    def __init__(
+        self,
+        sampling_backlog,
+        cache_only_backlog,
+        queue_wait,
+        recover_backlog,
+        recover_seconds,
+        max_age,
+        sample_rate,
+        min_risk,
+    ):
+        """
+        Args:
+            sampling_backlog: queued messages that start sampling
+            cache_only_backlog: queued messages that stop all new LLM requests
+            queue_wait: seconds a message waited for a worker that start sampling
+            recover_backlog: backlog that counts as recovered
+            recover_seconds: how long load must stay low before stepping down
+            max_age: seconds after publishing at which a message is skipped while degraded
+            sample_rate: share of low-risk messages still classified while sampling
+            min_risk: risk points with which a message is classified while sampling
+        """
+        self.sampling_backlog = sampling_backlog
+        self.cache_only_backlog = cache_only_backlog
+        self.queue_wait = queue_wait
+        self.recover_backlog = recover_backlog
+        self.recover_seconds = recover_seconds
+        self.max_age = max_age
+        self.sample_rate = sample_rate
+        self.min_risk = min_risk
+        self.level = NORMAL
+        self.calm_since = None  # Since when load has been low enough to step down
+        self.lock = threading.Lock()
+        self.longest_wait = 0.0  # Longest queue wait since the last update()
+        self.window = Counter()  # Counts since the last take_window()
+        self.total = Counter()
+
+    @property
+    def level_name(self):
+        return LEVEL_NAMES[self.level]
+
+    @property
+    def degraded(self):
+        return self.level > NORMAL
+
+    def update(self, backlog, now):
+        """Re-evaluate the level once per loop iteration. Returns True if it changed."""
+        with self.lock:
+            wait, self.longest_wait = self.longest_wait, 0.0
+        if backlog >= self.cache_only_backlog or wait >= self.max_age:
+            target = CACHE_ONLY
+        elif backlog >= self.sampling_backlog or wait >= self.queue_wait:
+            target = SAMPLING
+        else:
+            target = NORMAL
+
+        previous = self.level
+        if target > self.level:
+            self.level = target
+            self.calm_since = None
+            logger.warning(
+                f"🧯 Classification overloaded ({backlog} queued, waits up to {wait:.1f}s), "
+                f"switching to {self.level_name} mode."
+            )
+        elif self.level > NORMAL:
+            if target == self.level or backlog > self.recover_backlog:
+                self.calm_since = None
+            elif self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= self.recover_seconds:
+                self.level -= 1
+                self.calm_since = None
+                logger.info(
+                    f"🧯 Classification load is down ({backlog} queued), "
+                    f"back to {self.level_name} mode."
+                )
+        return self.level != previous
+
+    def note_wait(self, seconds):
+        """A worker took a message that waited `seconds` in the queue."""
+        with self.lock:
+            self.longest_wait = max(self.longest_wait, seconds)
+
+    def admit(self, risk, age):
+        """
+        Whether a message that is not in the verdict cache may go to the LLM.
+
+        Returns:
+            None if it may, otherwise why it is skipped:
+            "expired", "sampled_out" or "cache_only"
+        """
+        if self.level > NORMAL and age >= self.max_age:
+            reason = "expired"
+        elif self.level == CACHE_ONLY:
+            reason = "cache_only"
+        elif (
+            self.level == SAMPLING
+            and risk < self.min_risk
+            and random.random() >= self.sample_rate
+        ):
+            reason = "sampled_out"
+        else:
+            reason = None
+        if self.level > NORMAL:
+            self.count("degraded")
+        self.count(reason)
+        return reason
+
+    def expired(self, age):
+        """Whether a queued message that a worker takes is past its deadline while degraded."""
+        if self.level == NORMAL or age < self.max_age:
+            return False
+        self.count("expired")
+        return True
+
+    def count(self, key):
+        if key is None:
+            return
+        with self.lock:
+            self.window[key] += 1
+            self.total[key] += 1
+
+    def take_window(self):
+        """
+        Counts since the previous call: "degraded" messages that arrived in a
+        degraded mode, and skipped messages per reason.
+        """
+        with self.lock:
+            window, self.window = self.window, Counter()
+        return dict(window)
+
+    def summary(self):
+        with self.lock:
+            return {"level": self.level_name, **self.total}
@@ -0,0 +1,116 @@
+"""
+Classification worker pool and verdict cache shared by every moderated chat.
+
+Work is queued per chat and the workers take one item from each chat in
+turn, so a flood in one chat cannot starve the others. Within a chat the item
+with the lowest priority key runs first; the moderator uses the message's
+publish time minus a bonus for risky messages, so threats and messages that
+have waited longest are classified before fresh greetings. Verdicts are cached by
+message text, so the same spam posted in several chats reaches the LLM once.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+class ClassificationPool:
+    """Worker threads shared by all chats, serving the chats round-robin."""
+
+    def __init__(self, workers):
+        self.queues = {}  # chat_id -> heap of (priority, seq, future, fn, args)
+        self.sequence = itertools.count()  # Keeps equal priorities in submission order
+        self.ready = deque()  # Chats with queued work, in round-robin order
+        self.condition = threading.Condition()
+        self.threads = [
+            threading.Thread(target=self._run, daemon=True) for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, chat_id, fn, *args, priority=None):
+        """
+        Queue fn(*args) on behalf of `chat_id` and return its Future.
+
+        Items of a chat run in ascending `priority` (a timestamp-like key,
+        the submission time if omitted).
+        """
+        future = Future()
+        if priority is None:
+            priority = time.time()
+        with self.condition:
+            queue = self.queues.get(chat_id)
+            if queue is None:
+                queue = self.queues[chat_id] = []
+                self.ready.append(chat_id)
+            heapq.heappush(queue, (priority, next(self.sequence), future, fn, args))
+            self.condition.notify()
+        return future
+
+    def backlog(self, chat_id=None):
+        """Number of queued (not yet started) items, for one chat or all."""
+        with self.condition:
+            if chat_id is not None:
+                return len(self.queues.get(chat_id, ()))
+            return sum(len(queue) for queue in self.queues.values())
+
+    def discard(self, chat_id):
+        """Cancel the queued work of a chat that is no longer moderated."""
+        with self.condition:
+            queue = self.queues.pop(chat_id, None)
+            if queue is None:
+                return
+            self.ready.remove(chat_id)
+        for _, _, future, _, _ in queue:
+            future.cancel()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.ready:
+                    self.condition.wait()
+                chat_id = self.ready.popleft()
+                queue = self.queues[chat_id]
+                _, _, future, fn, args = heapq.heappop(queue)
+                if queue:
+                    self.ready.append(chat_id)
+                else:
+                    del self.queues[chat_id]
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class VerdictCache:
+    """Thread-safe LRU of moderation verdicts keyed by message text."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.verdicts = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        with self.lock:
+            verdict = self.verdicts.get(text)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.verdicts.move_to_end(text)
+            self.hits += 1
+            return verdict
+
+    def put(self, text, verdict):
+        with self.lock:
+            self.verdicts[text] = verdict
+            self.verdicts.move_to_end(text)
+            if len(self.verdicts) > self.max_size:
+                self.verdicts.popitem(last=False)
@@ -0,0 +1,177 @@
+"""
+Opt-in profiling of a running moderator.
+
+Started with --profile or toggled by sending the process SIGUSR1. While active,
+the profiler writes everything to its own directory under PROFILE_DIR:
+
+* stacks.folded: stacks of every thread sampled every few milliseconds, in
+  the folded format read by flamegraph.pl and speedscope;
+* phases.jsonl: one line per main loop iteration with the milliseconds spent
+  in each phase (poll, classify, delete, log, ads, stats, ...). Phases run by
+  the API worker threads are summed over the threads;
+* memory-N.txt / memory-N.snapshot: every `memory_interval` seconds, the
+  sizes of the moderator's big structures, the top tracemalloc allocation
+  sites, and the full tracemalloc snapshot for tracemalloc.Snapshot.load().
+
+When inactive, phase() costs one attribute check, so the hooks stay in the
+moderation loop.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger("youtube_moderator.profiler")
+
+
+class Profiler:
+    """Sampling profiler, phase timer and memory snapshots of the moderator process."""
+
+    def __init__(self, directory, sample_interval=0.01, memory_interval=60, structures=None):
+        """
+        Args:
+            directory: parent directory of the per-run output directories
+            sample_interval: seconds between stack samples
+            memory_interval: seconds between memory snapshots
+            structures: returns {name: item count} of the big structures
+        """
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.memory_interval = memory_interval
+        self.structures = structures
+        self.active = False
+        self.toggle_requested = False
+        self.lock = threading.Lock()
+        self.phases = defaultdict(float)  # phase -> seconds in this iteration
+        self.iteration = 0
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.output = None
+        self.phases_file = None
+        self.next_memory_time = 0
+        self.memory_snapshots = 0
+        self.started_tracemalloc = False  # Else it was on already, e.g. PYTHONTRACEMALLOC
+
+    def request_toggle(self, signum=None, frame=None):
+        """Signal handler: start or stop at the end of the current loop iteration."""
+        self.toggle_requested = True
+
+    def start(self):
+        if self.active:
+            return
+        self.output = os.path.join(
+            self.directory, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        )
+        os.makedirs(self.output, exist_ok=True)
+        self.phases_file = open(os.path.join(self.output, "phases.jsonl"), "a", encoding="utf-8")
+        self.stacks = Counter()
+        self.phases = defaultdict(float)
+        self.iteration = 0
+        self.memory_snapshots = 0
+        self.next_memory_time = 0
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+        self.stopped.clear()
+        self.sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.sampler.start()
+        self.active = True
+        logger.info(f"🔬 Profiling started, writing to {self.output}")
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self.stopped.set()
+        self.sampler.join()
+        self._snapshot_memory()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        self.phases_file.close()
+        with open(os.path.join(self.output, "stacks.folded"), "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(
+            f"🔬 Profiling stopped: {sum(self.stacks.values())} stack samples, "
+            f"{self.iteration} loop iterations, {self.memory_snapshots} memory snapshots "
+            f"in {self.output}"
+        )
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as part of `name` in the current iteration."""
+        if not self.active:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.phases[name] += elapsed
+
+    def end_iteration(self, now):
+        """Called once per main loop iteration: writes its phases, snapshots memory."""
+        if self.toggle_requested:
+            self.toggle_requested = False
+            if self.active:
+                self.stop()
+            else:
+                self.start()
+        if not self.active:
+            return
+        with self.lock:
+            phases, self.phases = self.phases, defaultdict(float)
+        self.iteration += 1
+        line = {
+            "time": now,
+            "iteration": self.iteration,
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+        }
+        self.phases_file.write(json.dumps(line) + "\n")
+        self.phases_file.flush()
+        if now >= self.next_memory_time:
+            self._snapshot_memory()
+            self.next_memory_time = now + self.memory_interval
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def _snapshot_memory(self):
+        self.memory_snapshots += 1
+        base = os.path.join(self.output, f"memory-{self.memory_snapshots}")
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"Traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            if self.structures is not None:
+                f.write("Structures (items):\n")
+                for name, size in self.structures().items():
+                    f.write(f"  {name}: {size}\n")
+                f.write("\n")
+            f.write("Top allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                f.write(f"  {stat}\n")
+        snapshot.dump(base + ".snapshot")
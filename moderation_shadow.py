@@ -0,0 +1,116 @@
+"""
+Shadow evaluation of a candidate prompt or model on live chat messages.
+
+After the production verdict of a message has been applied, a sampled fraction
+of messages is classified again by the candidate in the background. The
+candidate's verdicts are never acted on; disagreements with production are
+logged and appended to a CSV file for review.
+
+The shadow path cannot delay moderation. offer() never blocks, the candidate
+runs on its own threads, and work is dropped instead of queued when
+`max_pending` messages are already in flight or when production
+classification has a backlog.
+"""
+
+import csv
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("youtube_moderator.shadow")
+
+
+class ShadowEvaluator:
+    """Classifies a sample of live messages with a candidate and compares verdicts."""
+
+    def __init__(self, classify, sample_rate, max_pending, workers=1, log_path=None):
+        """
+        Args:
+            classify: candidate classifier, text -> "DELETE" or "KEEP"
+            sample_rate: fraction of offered messages that are evaluated
+            max_pending: evaluations in flight before new ones are skipped
+            workers: threads running the candidate
+            log_path: CSV file the disagreements are appended to
+        """
+        self.classify = classify
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.log_path = log_path
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="shadow")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.evaluated = 0
+        self.disagreements = 0
+        self.skipped = 0  # Sampled but dropped to protect production
+        self.failed = 0
+
+    def offer(self, message_id, message_text, production_decision, busy=False):
+        """
+        Maybe evaluate a message whose production verdict is final.
+
+        Args:
+            busy: production classification has a backlog, skip the message
+        Returns:
+            bool: True if the message was handed to the candidate
+        """
+        if not message_text or random.random() >= self.sample_rate:
+            return False
+        with self.lock:
+            if busy or self.pending >= self.max_pending:
+                self.skipped += 1
+                return False
+            self.pending += 1
+        self.executor.submit(self._evaluate, message_id, message_text, production_decision)
+        return True
+
+    def summary(self):
+        with self.lock:
+            agreement = (
+                1 - self.disagreements / self.evaluated if self.evaluated else None
+            )
+            return {
+                "evaluated": self.evaluated,
+                "disagreements": self.disagreements,
+                "agreement": round(agreement, 4) if agreement is not None else None,
+                "skipped": self.skipped,
+                "failed": self.failed,
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _evaluate(self, message_id, message_text, production_decision):
+        try:
+            shadow_decision = self.classify(message_text)
+        except Exception as e:
+            with self.lock:
+                self.pending -= 1
+                self.failed += 1
+            logger.debug(f"Shadow classification failed: {e}", extra={"sample": True})
+            return
+
+        agrees = shadow_decision == production_decision
+        with self.lock:
+            self.pending -= 1
+            self.evaluated += 1
+            if not agrees:
+                self.disagreements += 1
+            if not agrees and self.log_path is not None:
+                self._write(message_id, message_text, production_decision, shadow_decision)
+        if not agrees:
+            logger.info(
+                f"🔀 Shadow verdict {shadow_decision} differs from production "
+                f"{production_decision}: {message_text}",
+                extra={"context": {"message": message_id}},
+            )
+
+    def _write(self, message_id, message_text, production_decision, shadow_decision):
+        try:
+            with open(self.log_path, "a", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerow(
+                    [time.time(), message_id, production_decision, shadow_decision, message_text]
+                )
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to log shadow disagreement: {e}")
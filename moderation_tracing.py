@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Per-message trace spans in OpenTelemetry's OTLP/JSON format.
+
+Each traced chat message becomes one trace:
+
+    moderate_message   published -> chat log written
+    ├── await_poll     published -> the poll that fetched it started
+    ├── fetch          liveChatMessages.list call that returned it
+    ├── classify       fetched -> verdict, moderation.classifier = rule|cache|llm|skip|none
+    │   ├── queue      waiting for a classification worker (LLM only)
+    │   └── llm        the LLM request (LLM only)
+    ├── delete         liveChatMessages.delete call (removed messages only)
+    └── log            chat log write
+
+The spans are built after the message is logged, from the timestamps its
+MessageTiming collected anyway for the latency histograms. So a message that
+is not traced costs only the sampling check. Messages are sampled by a hash
+of their ID at `sample_rate`, and every message whose verdict took longer
+than `slow_seconds` is traced as well.
+
+A background thread writes one OTLP ExportTraceServiceRequest per line. This
+is the format of the OpenTelemetry Collector's file exporter, which its
+otlpjsonfile receiver can forward to Jaeger, Tempo and so on. If the writer
+falls behind, traces are dropped and counted instead of blocking.
+
+Summarize the slowest traces of a file:
+
+    python moderation_tracing.py moderation_traces.jsonl --top 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import statistics
+import threading
+import zlib
+
+logger = logging.getLogger("youtube_moderator.tracing")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+
+def attribute(key, value):
+    """One OTLP key/value attribute."""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class MessageTracer:
+    """Turns moderated messages into OTLP spans and writes them in the background."""
+
+    def __init__(self, path, sample_rate, slow_seconds, queue_size=10000, service="youtube-moderator"):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.resource = {"attributes": [attribute("service.name", service)]}
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.traced = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="tracing", daemon=True)
+        self.thread.start()
+
+    def sampled(self, message_id, timing):
+        if timing.verdict_at is not None and (
+            timing.verdict_at - timing.published_at >= self.slow_seconds
+        ):
+            return True
+        return zlib.crc32(message_id.encode()) < self.sample_rate * 2**32
+
+    def trace(self, live_chat_id, message_id, timing, decision, is_removed, log_started_at, log_ended_at):
+        """Export the spans of a logged message if it is sampled. Returns True if so."""
+        if not self.sampled(message_id, timing):
+            return False
+        trace_id = os.urandom(16).hex()
+        spans = []
+
+        def add(name, start, end, parent, attributes=(), kind=SPAN_KIND_INTERNAL, error=False):
+            span_id = os.urandom(8).hex()
+            span = {
+                "traceId": trace_id,
+                "spanId": span_id,
+                "name": name,
+                "kind": kind,
+                "startTimeUnixNano": str(int(start * 1e9)),
+                "endTimeUnixNano": str(int(max(start, end) * 1e9)),
+                "attributes": [attribute(key, value) for key, value in attributes],
+            }
+            if parent is not None:
+                span["parentSpanId"] = parent
+            if error:
+                span["status"] = {"code": STATUS_CODE_ERROR}
+            spans.append(span)
+            return span_id
+
+        verdict_at = timing.verdict_at or log_started_at
+        fetch_started_at = timing.poll_started_at or timing.fetched_at
+        root = add(
+            "moderate_message",
+            min(timing.published_at, fetch_started_at),
+            log_ended_at,
+            None,
+            [
+                ("youtube.live_chat_id", live_chat_id),
+                ("youtube.message_id", message_id),
+                ("moderation.decision", decision),
+                ("moderation.classifier", timing.classifier or "none"),
+                ("moderation.removed", is_removed),
+            ],
+        )
+        if timing.published_at < fetch_started_at:
+            add("await_poll", timing.published_at, fetch_started_at, root)
+        add("fetch", fetch_started_at, timing.fetched_at, root, kind=SPAN_KIND_CLIENT)
+        classify = add(
+            "classify",
+            timing.fetched_at,
+            verdict_at,
+            root,
+            [("moderation.classifier", timing.classifier or "none")],
+        )
+        if timing.classify_started_at is not None:
+            add("queue", timing.fetched_at, timing.classify_started_at, classify)
+            add("llm", timing.classify_started_at, verdict_at, classify, kind=SPAN_KIND_CLIENT)
+        if timing.delete_started_at is not None:
+            add(
+                "delete",
+                timing.delete_started_at,
+                timing.deleted_at or log_started_at,
+                root,
+                kind=SPAN_KIND_CLIENT,
+                error=not is_removed,
+            )
+        add("log", log_started_at, log_ended_at, root)
+
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": self.resource,
+                    "scopeSpans": [{"scope": {"name": "youtube_moderator"}, "spans": spans}],
+                }
+            ]
+        }
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.traced += 1
+        return True
+
+    def close(self):
+        """Write out the queued traces and stop the writer."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        try:
+            f = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"⚠️ Cannot open trace file, tracing disabled: {e}")
+            while self.queue.get() is not None:
+                pass
+            return
+        with f:
+            while True:
+                request = self.queue.get()
+                if request is None:
+                    return
+                f.write(json.dumps(request, separators=(",", ":")) + "\n")
+                if self.queue.empty():
+                    f.flush()
+
+
+def read_traces(path):
+    """traceId -> list of spans from an OTLP/JSON lines file."""
+    traces = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+
+def span_seconds(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+
+
+def span_attributes(span):
+    return {
+        item["key"]: next(iter(item["value"].values()))
+        for item in span.get("attributes", [])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize moderation traces.")
+    parser.add_argument("path", nargs="?", default="moderation_traces.jsonl")
+    parser.add_argument("--top", type=int, default=10, help="Slowest traces to show.")
+    args = parser.parse_args()
+
+    traces = read_traces(args.path)
+    roots = []
+    durations = {}  # span name -> seconds of every span with that name
+    for spans in traces.values():
+        root = next((span for span in spans if "parentSpanId" not in span), None)
+        if root is None:
+            continue
+        children = {
+            span["name"]: span_seconds(span)
+            for span in spans
+            if span.get("parentSpanId") == root["spanId"]
+        }
+        for span in spans:
+            durations.setdefault(span["name"], []).append(span_seconds(span))
+        roots.append((span_seconds(root), span_attributes(root), children))
+
+    print(f"{len(roots)} traces in {args.path}\n")
+    print(f"{'span':<18}{'count':>8}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for name, seconds in sorted(durations.items(), key=lambda item: -max(item[1])):
+        seconds.sort()
+        p95 = seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))]
+        print(
+            f"{name:<18}{len(seconds):>8}{statistics.median(seconds):>10.3f}"
+            f"{p95:>10.3f}{seconds[-1]:>10.3f}"
+        )
+
+    print(f"\nSlowest {min(args.top, len(roots))} traces:")
+    roots.sort(key=lambda item: item[0], reverse=True)
+    for total, attributes, children in roots[: args.top]:
+        breakdown = ", ".join(
+            f"{name} {seconds:.3f}s"
+            for name, seconds in sorted(children.items(), key=lambda item: -item[1])
+        )
+        print(
+            f"{total:8.3f}s  {attributes.get('youtube.message_id')} "
+            f"chat={attributes.get('youtube.live_chat_id')} "
+            f"{attributes.get('moderation.decision') or 'KEEP'}/"
+            f"{attributes.get('moderation.classifier')} "
+            f"removed={attributes.get('moderation.removed')}  {breakdown}"
+        )
+
+
+if __name__ == "__main__":
+    main()
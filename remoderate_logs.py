@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Re-moderate past chat logs with the current (or a candidate) prompt and model.
+
+Reads chat_messages.log and its rotated archives (plain, .gz, .bz2 or .xz)
+row by row, classifies every message with the LLM and compares the verdict
+with the logged is_removed column. Memory stays bounded for logs of any size:
+
+* rows are processed in chunks of --chunk-size;
+* within a chunk each distinct text is classified once, and verdicts are
+  remembered in an LRU of --cache-size texts across chunks;
+* the texts of a chunk are classified in parallel by --workers threads;
+* changed verdicts are streamed to --diff-out instead of kept in memory.
+
+Note that is_removed records whether the delete succeeded, so a failed delete
+shows up as "logged kept".
+
+    python remoderate_logs.py
+    python remoderate_logs.py chat_messages.log.1.gz --prompt-file best_context.txt --diff-out diff.csv
+"""
+
+import argparse
+import bz2
+import csv
+import glob
+import gzip
+import json
+import lzma
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import youtube_moderator as ym
+from moderation_pool import VerdictCache
+
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def log_files(paths):
+    """The given logs, or chat_messages.log and its rotated archives."""
+    if paths:
+        return paths
+    return sorted(glob.glob(ym.CHAT_LOG_FILE + "*"))
+
+
+def read_rows(path):
+    """Yield (line_number, user_id, user_name, text, logged_removed) of a chat log."""
+    opener = next(
+        (open_fn for suffix, open_fn in OPENERS.items() if path.endswith(suffix)), open
+    )
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        for line_number, row in enumerate(csv.reader(f), start=1):
+            if len(row) != 4:
+                continue  # Truncated or foreign line
+            user_id, user_name, text, is_removed = row
+            yield line_number, user_id, user_name, text, is_removed == "True"
+
+
+def classify_chunk(texts, classify, cache, executor, stats):
+    """Verdicts of the distinct `texts`, asking the LLM only for unknown ones."""
+    verdicts = {}
+    unknown = []
+    for text in texts:
+        verdict = cache.get(text) if text else "KEEP"
+        if verdict is None:
+            unknown.append(text)
+        else:
+            verdicts[text] = verdict
+
+    def run(text):
+        try:
+            return classify(text)
+        except Exception as e:
+            print(f"[ERROR] LLM request failed for {text!r}: {e}", file=sys.stderr)
+            return None
+
+    for text, verdict in zip(unknown, executor.map(run, unknown)):
+        stats["llm_calls"] += 1
+        if verdict is None:
+            stats["errors"] += 1
+            continue
+        cache.put(text, verdict)
+        verdicts[text] = verdict
+    return verdicts
+
+
+def remoderate(paths, classify, workers, chunk_size, cache_size, diff_out=None):
+    stats = {
+        "rows": 0,
+        "max_distinct_texts_per_chunk": 0,  # Largest batch of texts looked up at once
+        "llm_calls": 0,
+        "errors": 0,
+        "logged_removed": 0,
+        "now_removed": 0,
+        "both_removed": 0,
+        "both_kept": 0,
+        "newly_removed": 0,  # Kept back then, deleted now
+        "newly_kept": 0,  # Deleted back then, kept now
+    }
+    cache = VerdictCache(cache_size)
+    diff_writer = None
+    if diff_out is not None:
+        diff_file = open(diff_out, "w", encoding="utf-8", newline="")
+        diff_writer = csv.writer(diff_file)
+        diff_writer.writerow(["file", "line", "user_id", "user_name", "text", "logged", "now"])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        for path in paths:
+            rows = read_rows(path)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                texts = {row[3] for row in chunk}
+                stats["max_distinct_texts_per_chunk"] = max(
+                    stats["max_distinct_texts_per_chunk"], len(texts)
+                )
+                verdicts = classify_chunk(texts, classify, cache, executor, stats)
+                for line_number, user_id, user_name, text, logged_removed in chunk:
+                    verdict = verdicts.get(text)
+                    if verdict is None:
+                        continue  # LLM error, counted above
+                    stats["rows"] += 1
+                    now_removed = verdict == "DELETE"
+                    stats["logged_removed"] += logged_removed
+                    stats["now_removed"] += now_removed
+                    if logged_removed == now_removed:
+                        stats["both_removed" if now_removed else "both_kept"] += 1
+                        continue
+                    stats["newly_removed" if now_removed else "newly_kept"] += 1
+                    if diff_writer is not None:
+                        diff_writer.writerow(
+                            [
+                                path,
+                                line_number,
+                                user_id,
+                                user_name,
+                                text,
+                                "DELETE" if logged_removed else "KEEP",
+                                verdict,
+                            ]
+                        )
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{path}: {stats['rows']} rows, {stats['llm_calls']} LLM calls, "
+                    f"{stats['rows'] / elapsed:.0f} rows/s",
+                    file=sys.stderr,
+                )
+    if diff_writer is not None:
+        diff_file.close()
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    stats["agreement"] = (
+        round((stats["both_removed"] + stats["both_kept"]) / stats["rows"], 4)
+        if stats["rows"]
+        else None
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-moderate past chat logs and compare with the logged verdicts."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help=f"Chat logs to read (default: {ym.CHAT_LOG_FILE} and its rotated archives).",
+    )
+    parser.add_argument(
+        "--prompt-file", help="System prompt to use instead of LLM_SYSTEM_PROMPT."
+    )
+    parser.add_argument("--model", default=ym.LLM_MODEL_NAME)
+    parser.add_argument("--workers", type=int, default=ym.CLASSIFICATION_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--cache-size", type=int, default=200000)
+    parser.add_argument("--diff-out", help="CSV file receiving every changed verdict.")
+    args = parser.parse_args()
+
+    prompt = ym.LLM_SYSTEM_PROMPT
+    if args.prompt_file:
+        with open(args.prompt_file, "r", encoding="utf-8") as f:
+            prompt = f.read().strip()
+
+    paths = log_files(args.paths)
+    if not paths:
+        print("No chat logs found.", file=sys.stderr)
+        sys.exit(1)
+
+    report = remoderate(
+        paths,
+        lambda text: ym.classify_with_candidate(text, prompt, args.model),
+        args.workers,
+        args.chunk_size,
+        args.cache_size,
+        args.diff_out,
+    )
+    report["files"] = paths
+    report["model"] = args.model
+    report["prompt"] = args.prompt_file or "LLM_SYSTEM_PROMPT"
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Stats store shared by all animation-server.py worker processes.
+
+The current stats record lives in an anonymous shared memory mapping created
+before the workers are forked, so every worker sees the same bytes. Access
+follows a seqlock:
+
+* writers (any worker) take an inter-process lock, bump the sequence to an
+  odd value, write the payload, then bump it to the next even value;
+* readers take no lock at all: they copy the payload and retry if the
+  sequence was odd or changed while they were copying.
+
+A writer killed mid-update leaves the sequence odd forever. A reader that
+sees it odd for longer than WRITER_STALL_SECONDS takes the writer lock, which
+the dead writer no longer holds, and restores the last record this process
+read completely.
+
+Checking for a new version is a single 8-byte read, so workers can afford to
+do it on every request.
+"""
+
+import fcntl
+import json
+from contextlib import contextmanager
+import mmap
+import struct
+import tempfile
+import threading
+import time
+
+HEADER = struct.Struct("=QI")  # sequence, payload length
+DEFAULT_PAYLOAD_SIZE = 64 * 1024
+WRITER_STALL_SECONDS = 0.1  # Updates take microseconds; longer means the writer died
+
+
+class PayloadTooLarge(ValueError):
+    """The serialized stats do not fit into the shared region."""
+
+
+class SharedStatsStore:
+    """Seqlock-protected stats record in shared memory."""
+
+    def __init__(self, payload_size=DEFAULT_PAYLOAD_SIZE):
+        self.payload_size = payload_size
+        # MAP_SHARED anonymous memory: inherited, not copied, by forked workers
+        self.buffer = mmap.mmap(-1, HEADER.size + payload_size)
+        # POSIX record locks are held per process, so this excludes writers in
+        # other workers and is released automatically if a worker dies
+        self.lock_file = tempfile.TemporaryFile()
+        self.thread_lock = threading.Lock()
+        self.last_good = (0, None)  # Last complete (version, record) read by this process
+
+    def version(self):
+        """Current sequence number; even values are stable, 0 means empty."""
+        return struct.unpack_from("=Q", self.buffer, 0)[0]
+
+    def read(self):
+        """
+        Lock-free consistent read.
+
+        Returns:
+            tuple: (version, record dict or None if nothing was written yet)
+        """
+        deadline = None
+        while True:
+            before, length = HEADER.unpack_from(self.buffer, 0)
+            if before & 1:
+                if deadline is None:
+                    deadline = time.monotonic() + WRITER_STALL_SECONDS
+                elif time.monotonic() >= deadline:
+                    with self.writer_lock():
+                        return self.read_locked()
+                time.sleep(0)  # A writer is mid-update
+                continue
+            data = self.buffer[HEADER.size : HEADER.size + length]
+            if self.version() == before:
+                self.last_good = (before, json.loads(data) if length else None)
+                return self.last_good
+
+    def read_locked(self):
+        """Read under the writer lock, repairing the record of a writer that died."""
+        version, length = HEADER.unpack_from(self.buffer, 0)
+        if not version & 1:
+            data = self.buffer[HEADER.size : HEADER.size + length]
+            self.last_good = (version, json.loads(data) if length else None)
+            return self.last_good
+        # No writer is active, so the one that made the sequence odd died
+        # mid-update and the payload may be torn
+        record = self.last_good[1]
+        data = json.dumps(record).encode("utf-8") if record is not None else b""
+        self.buffer[HEADER.size : HEADER.size + len(data)] = data
+        HEADER.pack_into(self.buffer, 0, version + 1, len(data))
+        self.last_good = (version + 1, record)
+        return self.last_good
+
+    @contextmanager
+    def writer_lock(self):
+        with self.thread_lock:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_UN)
+
+    def update(self, build_record):
+        """
+        Replace the record under the writer lock.
+
+        Args:
+            build_record: called with the current record (or None) and
+                          returning the new JSON-serializable record
+        Returns:
+            tuple: (new version, new record)
+        """
+        with self.writer_lock():
+            version, current = self.read_locked()
+            record = build_record(current)
+            data = json.dumps(record).encode("utf-8")
+            if len(data) > self.payload_size:
+                raise PayloadTooLarge(
+                    f"Stats payload of {len(data)} bytes exceeds {self.payload_size}"
+                )
+            struct.pack_into("=Q", self.buffer, 0, version + 1)
+            self.buffer[HEADER.size : HEADER.size + len(data)] = data
+            HEADER.pack_into(self.buffer, 0, version + 2, len(data))
+            self.last_good = (version + 2, record)
+            return self.last_good
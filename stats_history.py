@@ -0,0 +1,195 @@
+"""
+Fixed-size time-series history of stream stats for animation-server.py.
+
+Every video gets a ring buffer of preallocated arrays (one per field), so
+memory is fixed up front and recording a sample never allocates. Queries
+downsample a time window into min/max/avg buckets using scratch arrays that
+are also allocated once, touching only the samples inside the window.
+"""
+
+import base64
+import threading
+from array import array
+
+HISTORY_FIELDS = ("online_viewers", "total_views", "likes", "comments")
+
+
+class StatsRing:
+    """Ring buffer of stats samples for a single video."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.values = {
+            field: array("d", bytes(8 * capacity)) for field in HISTORY_FIELDS
+        }
+        self.start = 0  # Physical index of the oldest sample
+        self.size = 0
+
+    def append(self, timestamp, stats):
+        """Store a sample, overwriting the oldest one once the buffer is full."""
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        for field in HISTORY_FIELDS:
+            self.values[field][index] = float(stats.get(field) or 0)
+
+    def export(self):
+        """Samples oldest-first as base64 array bytes (fast to dump and load)."""
+
+        def ordered(values):
+            end = self.start + self.size
+            if end <= self.capacity:
+                data = values[self.start : end]
+            else:
+                data = values[self.start :] + values[: end - self.capacity]
+            return base64.b64encode(data.tobytes()).decode("ascii")
+
+        exported = {"timestamps": ordered(self.timestamps)}
+        for field in HISTORY_FIELDS:
+            exported[field] = ordered(self.values[field])
+        return exported
+
+    def restore(self, exported):
+        """Load samples produced by export(), keeping the newest that fit."""
+
+        def decoded(key):
+            values = array("d")
+            if key in exported:
+                values.frombytes(base64.b64decode(exported[key]))
+            return values
+
+        timestamps = decoded("timestamps")
+        size = min(len(timestamps), self.capacity)
+        skip = len(timestamps) - size
+        self.timestamps[:size] = timestamps[skip:]
+        for field in HISTORY_FIELDS:
+            values = decoded(field)
+            if len(values) != len(timestamps):
+                values = array("d", bytes(8 * len(timestamps)))
+            self.values[field][:size] = values[skip:]
+        self.start = 0
+        self.size = size
+
+    def first_at_or_after(self, timestamp):
+        """Logical index of the first sample not older than `timestamp`."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(self.start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+class StatsHistory:
+    """Per-video stats rings with a bounded number of tracked videos."""
+
+    def __init__(self, capacity, max_videos, max_resolution):
+        self.capacity = capacity
+        self.max_videos = max_videos
+        self.max_resolution = max_resolution
+        self.rings = {}  # video_id -> StatsRing, in least recently updated order
+        self.lock = threading.Lock()
+        # Downsampling scratch space shared by all queries (guarded by lock)
+        self.counts = array("q", bytes(8 * max_resolution))  # "l" is 4 bytes on Windows
+        self.mins = {f: array("d", bytes(8 * max_resolution)) for f in HISTORY_FIELDS}
+        self.maxs = {f: array("d", bytes(8 * max_resolution)) for f in HISTORY_FIELDS}
+        self.sums = {f: array("d", bytes(8 * max_resolution)) for f in HISTORY_FIELDS}
+
+    def record(self, video_id, timestamp, stats):
+        """Append a stats sample for `video_id`."""
+        with self.lock:
+            ring = self.rings.pop(video_id, None)
+            if ring is None:
+                if len(self.rings) >= self.max_videos:
+                    # Reuse the buffers of the video that went quiet longest ago
+                    ring = self.rings.pop(next(iter(self.rings)))
+                    ring.start = ring.size = 0
+                else:
+                    ring = StatsRing(self.capacity)
+            self.rings[video_id] = ring
+            ring.append(timestamp, stats)
+
+    def export(self):
+        """Dump every ring, least recently updated first."""
+        with self.lock:
+            return {video_id: ring.export() for video_id, ring in self.rings.items()}
+
+    def restore(self, exported):
+        """Replace all rings with ones loaded from export()."""
+        with self.lock:
+            self.rings = {}
+            for video_id in list(exported)[-self.max_videos :]:
+                ring = StatsRing(self.capacity)
+                ring.restore(exported[video_id])
+                self.rings[video_id] = ring
+
+    def query(self, video_id, window, resolution, until):
+        """
+        Downsample the samples in [until - window, until] into `resolution`
+        equal buckets.
+
+        Returns:
+            dict: Bucket start times, sample counts and min/max/avg per field
+            (None for empty buckets), or None if the video has no history.
+        """
+        resolution = max(1, min(int(resolution), self.max_resolution))
+        bucket_seconds = window / resolution
+        since = until - window
+        counts = self.counts
+
+        with self.lock:
+            ring = self.rings.get(video_id)
+            if ring is None:
+                return None
+
+            for b in range(resolution):
+                counts[b] = 0
+            for field in HISTORY_FIELDS:
+                mins, maxs, sums = self.mins[field], self.maxs[field], self.sums[field]
+                for b in range(resolution):
+                    mins[b] = float("inf")
+                    maxs[b] = float("-inf")
+                    sums[b] = 0.0
+
+            timestamps = ring.timestamps
+            for i in range(ring.first_at_or_after(since), ring.size):
+                index = (ring.start + i) % ring.capacity
+                timestamp = timestamps[index]
+                if timestamp > until:
+                    break
+                b = min(int((timestamp - since) / bucket_seconds), resolution - 1)
+                counts[b] += 1
+                for field in HISTORY_FIELDS:
+                    value = ring.values[field][index]
+                    if value < self.mins[field][b]:
+                        self.mins[field][b] = value
+                    if value > self.maxs[field][b]:
+                        self.maxs[field][b] = value
+                    self.sums[field][b] += value
+
+            result = {
+                "video_id": video_id,
+                "window": window,
+                "resolution": resolution,
+                "bucket_seconds": bucket_seconds,
+                "timestamps": [since + b * bucket_seconds for b in range(resolution)],
+                "samples": counts[:resolution].tolist(),
+            }
+            for field in HISTORY_FIELDS:
+                mins, maxs, sums = self.mins[field], self.maxs[field], self.sums[field]
+                result[field] = {
+                    "min": [mins[b] if counts[b] else None for b in range(resolution)],
+                    "max": [maxs[b] if counts[b] else None for b in range(resolution)],
+                    "avg": [
+                        sums[b] / counts[b] if counts[b] else None
+                        for b in range(resolution)
+                    ],
+                }
+            return result
@@ -0,0 +1,148 @@
+"""
+Durable storage for animation-server.py stats: an append-only update log plus
+periodic compact snapshots.
+
+All disk writes happen on a background thread; the request path only puts a
+record on a queue. Every record carries a sequence number and each snapshot
+stores the last sequence it includes, so restore = load snapshot + replay the
+log records after it, and the records up to that sequence can be dropped from
+the log right after a snapshot.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+SNAPSHOT_FILE = "stats_snapshot.json"
+LOG_FILE = "stats_updates.log"
+
+
+class StatsPersistence:
+    """Background writer for the stats update log and snapshots."""
+
+    def __init__(self, directory, snapshot_interval, take_snapshot):
+        """
+        Args:
+            directory: where the snapshot and log files live
+            snapshot_interval: seconds between snapshots while updates arrive
+            take_snapshot: callable returning a JSON-serializable dict with a
+                           consistent copy of the state and its "seq"
+        """
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.snapshot_interval = snapshot_interval
+        self.take_snapshot = take_snapshot
+        self.records = queue.SimpleQueue()
+        self.thread = None
+        self.compact_pending = False  # Log records were replayed on load
+
+    def load(self):
+        """
+        Read the persisted state.
+
+        Returns:
+            tuple: (snapshot dict or None, list of log records newer than it)
+        """
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable stats snapshot: {e}")
+
+        last_seq = snapshot["seq"] if snapshot else 0
+        records = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn final line from a crash mid-write
+                    if record["seq"] > last_seq:
+                        records.append(record)
+        self.compact_pending = bool(records)
+        return snapshot, records
+
+    def append(self, record):
+        """Queue an update record for the log. Never blocks on disk."""
+        self.records.put(record)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Flush queued records and write a final snapshot."""
+        if self.thread:
+            self.records.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _run(self):
+        log_file = open(self.log_path, "a", encoding="utf-8")
+        dirty = self.compact_pending
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        try:
+            while True:
+                timeout = max(0.0, next_snapshot - time.monotonic())
+                try:
+                    record = self.records.get(timeout=timeout)
+                except queue.Empty:
+                    record = False
+
+                if record:
+                    log_file.write(json.dumps(record) + "\n")
+                    log_file.flush()
+                    dirty = True
+
+                if record is None or time.monotonic() >= next_snapshot:
+                    if dirty:
+                        log_file = self._write_snapshot(log_file)
+                        dirty = False
+                    next_snapshot = time.monotonic() + self.snapshot_interval
+                if record is None:
+                    break
+        except Exception as e:
+            print(f"❌ Stats persistence stopped: {e}")
+        finally:
+            log_file.close()
+
+    def _write_snapshot(self, log_file):
+        """Atomically replace the snapshot, then start a fresh log."""
+        try:
+            snapshot = self.take_snapshot()
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"⚠️ Failed to write stats snapshot: {e}")
+            return log_file
+
+        # Drop only the records the snapshot covers. Records queued before it
+        # but written after are kept, and so is anything newer in the log.
+        log_file.close()
+        try:
+            kept = []
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if json.loads(line)["seq"] > snapshot["seq"]:
+                            kept.append(line)
+                    except (ValueError, KeyError):
+                        break  # Torn final line from a crash mid-write
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.log_path)
+        except OSError as e:
+            print(f"⚠️ Failed to compact stats update log: {e}")
+        return open(self.log_path, "a", encoding="utf-8")
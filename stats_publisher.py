@@ -0,0 +1,111 @@
+"""
+Background publisher of stream statistics to the animation server.
+
+The moderator only hands the latest stats to publish(), which never blocks.
+One thread sends them over a persistent HTTP connection:
+
+* updates are coalesced per video: if the server is slow or down, only the
+  newest stats of each video are kept and sent once it is back;
+* stats equal to the last ones sent (apart from their timestamp) are skipped,
+  but resent after `resend_after` seconds, so an overlay server that restarted
+  gets them again even while nothing changes;
+* failed sends are retried with exponential backoff, and the next stats of
+  the video are sent even if unchanged.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger("youtube_moderator.stats")
+
+IGNORED_FIELDS = ("last_updated",)  # Always differs, not a change by itself
+
+
+class StatsPublisher:
+    """Sends the latest stats of each video from a background thread."""
+
+    def __init__(self, url, timeout=5, min_backoff=1, max_backoff=60, resend_after=120):
+        self.url = url
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.resend_after = resend_after
+        self.session = requests.Session()  # Keeps the connection open between sends
+        self.latest = {}  # video_id -> stats not sent yet
+        self.last_sent = {}  # video_id -> stats last accepted by the server
+        self.last_sent_at = {}  # video_id -> when they were accepted
+        self.condition = threading.Condition()
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def publish(self, stats):
+        """Queue stats for sending, replacing older unsent stats of the video."""
+        with self.condition:
+            self.latest[stats.get("video_id", "")] = stats
+            self.condition.notify()
+
+    def _run(self):
+        backoff = 0
+        while True:
+            with self.condition:
+                while not self.latest:
+                    self.condition.wait()
+                video_id, stats = next(iter(self.latest.items()))
+                del self.latest[video_id]
+
+            if self._unchanged(video_id, stats):
+                self.skipped += 1
+                continue
+
+            if self._send(stats):
+                self.last_sent[video_id] = stats
+                self.last_sent_at[video_id] = time.monotonic()
+                self.sent += 1
+                backoff = 0
+                continue
+
+            self.failed += 1
+            # The server may have lost its state, send the next stats in any case
+            self.last_sent.pop(video_id, None)
+            backoff = min(self.max_backoff, max(self.min_backoff, backoff * 2))
+            with self.condition:
+                # Retry these stats unless newer ones arrived meanwhile
+                self.latest.setdefault(video_id, stats)
+            time.sleep(backoff)
+
+    def _unchanged(self, video_id, stats):
+        last = self.last_sent.get(video_id)
+        if last is None or time.monotonic() - self.last_sent_at[video_id] >= self.resend_after:
+            return False
+        return all(
+            stats.get(key) == last.get(key)
+            for key in stats.keys() | last.keys()
+            if key not in IGNORED_FIELDS
+        )
+
+    def _send(self, stats):
+        try:
+            response = self.session.post(self.url, json=stats, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("success"):
+                    logger.info(
+                        f"📝 Updated stats via API - Concurrent viewers: {stats['online_viewers']}, Total views: {stats['total_views']}"
+                    )
+                    return True
+                logger.error(f"❌ API returned error: {data.get('error')}")
+                return False
+            logger.error(f"❌ API request failed with status: {response.status_code}")
+            return False
+        except requests.exceptions.ConnectionError:
+            logger.warning("⚠️ Cannot connect to animation server. Stats not updated.")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Error updating stats via API: {e}")
+            return False
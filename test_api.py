@@ -8,7 +8,7 @@ import json
 import time
 import random
 
-API_BASE = "http://localhost:5000"
+API_BASE = "http://localhost:5555"
 
 
 def test_health():
@@ -66,7 +66,7 @@ if __name__ == "__main__":
 
     # Test health endpoint
     if not test_health():
-        print("Server is not running. Please start it with: python api_server.py")
+        print("Server is not running. Please start it with: python animation-server.py")
         exit(1)
 
     # Test get stats
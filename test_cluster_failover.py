@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Test script for handing a chat over between cluster workers while messages
+are still waiting for the LLM. Runs offline: two workers are simulated in
+this process, sharing a temporary cluster store, with a stub LLM that holds
+its answers until released.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import youtube_moderator as ym
+from moderation_cluster import ClusterStore
+
+CHAT_ID = "failover-chat"
+STREAM_IDS = (CHAT_ID, "failover-broadcast", "failover-video")
+llm_released = threading.Event()
+
+
+def stub_llm(message_text):
+    llm_released.wait()
+    return "KEEP"
+
+
+def page(first, count):
+    published_at = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    return {
+        "items": [
+            {
+                "id": f"msg-{n}",
+                "snippet": {"displayMessage": f"hello {n}", "publishedAt": published_at},
+                "authorDetails": {"displayName": f"user{n}", "channelId": f"UC{n}"},
+            }
+            for n in range(first, first + count)
+        ]
+    }
+
+
+def new_session():
+    return ym.ChatSession(*STREAM_IDS)
+
+
+def checkpoint(session):
+    """The session's checkpoint state, as it is read back from the file."""
+    return json.loads(json.dumps(ym.chat_session_state(session, time.time())))
+
+
+def as_worker(worker_id):
+    ym.cluster_worker_id = worker_id
+
+
+def wait_for_verdicts(session, timeout=5):
+    deadline = time.time() + timeout
+    while session.pending and time.time() < deadline:
+        ym.apply_verdicts(None, session)
+        time.sleep(0.01)
+    return not session.pending
+
+
+def logged_ids():
+    with open(ym.CHAT_LOG_FILE, "r", encoding="utf-8") as f:
+        return {line.split(",")[0] for line in f}
+
+
+def test_handover_after_stop():
+    """Worker A stops with messages waiting for the LLM; B moderates them."""
+    print("🔁 Testing handover after the old worker stopped...")
+    llm_released.clear()
+    as_worker("worker-a")
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(0, 5))
+    ym.end_chat_session(session_a)
+
+    as_worker("worker-b")
+    session_b = new_session()
+    ym.process_chat_page(session_b, page(0, 5))
+    llm_released.set()
+    if len(session_b.pending) != 5 or not wait_for_verdicts(session_b):
+        print(f"❌ Worker B queued {len(session_b.pending)} of 5 messages")
+        return False
+    print("✅ Worker B moderated all 5 messages")
+    return True
+
+
+def test_handover_while_old_worker_runs():
+    """B polls before A has stopped; B takes the messages once A releases them."""
+    print("🔁 Testing handover while the old worker still holds the messages...")
+    llm_released.clear()
+    as_worker("worker-a")
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(10, 5))
+
+    as_worker("worker-b")
+    session_b = new_session()
+    ym.process_chat_page(session_b, page(10, 5))
+    if session_b.pending or len(session_b.contested) != 5:
+        print(f"❌ Worker B took {len(session_b.pending)} messages still claimed by A")
+        return False
+
+    as_worker("worker-a")
+    ym.end_chat_session(session_a)
+    as_worker("worker-b")
+    ym.process_chat_page(session_b, {"items": []})  # Next poll, no new messages
+    llm_released.set()
+    if len(session_b.pending) != 5 or not wait_for_verdicts(session_b):
+        print(f"❌ Worker B queued {len(session_b.pending)} of 5 released messages")
+        return False
+    print("✅ Worker B moderated all 5 messages after A released them")
+    return True
+
+
+def test_dead_worker():
+    """A dies without stopping its chats; its unfinished claims are released."""
+    print("💀 Testing a worker that dies with messages waiting...")
+    llm_released.clear()
+    as_worker("worker-a")
+    ym.cluster_store.heartbeat("worker-a", now=time.time() - 3600)
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(20, 5))
+    ym.cluster_store.rebalance(ym.WORKER_TIMEOUT_SECONDS)
+    ym.classification_pool.discard(CHAT_ID)  # The process is gone
+
+    as_worker("worker-b")
+    session_b = new_session()
+    ym.process_chat_page(session_b, page(20, 5))
+    llm_released.set()
+    if len(session_b.pending) != 5 or not wait_for_verdicts(session_b):
+        print(f"❌ Worker B queued {len(session_b.pending)} of 5 messages")
+        return False
+    print("✅ Worker B moderated the dead worker's 5 messages")
+    return True
+
+
+def test_finished_messages_not_redone():
+    """Messages whose verdict A applied are skipped by B."""
+    print("✔️ Testing that finished messages are not moderated twice...")
+    llm_released.set()
+    as_worker("worker-a")
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(30, 5))
+    if not wait_for_verdicts(session_a):
+        print("❌ Worker A did not finish its messages")
+        return False
+    ym.end_chat_session(session_a)
+
+    as_worker("worker-b")
+    session_b = new_session()
+    ym.process_chat_page(session_b, page(30, 5))
+    if session_b.pending or session_b.contested:
+        print(f"❌ Worker B took {len(session_b.pending)} finished messages again")
+        return False
+    print("✅ Worker B skipped all 5 finished messages")
+    return True
+
+
+def test_restart_after_takeover():
+    """A restarts from a checkpoint after B took its messages; A leaves them to B."""
+    print("♻️ Testing a restart from a checkpoint after another worker took over...")
+    llm_released.clear()
+    as_worker("worker-a")
+    ym.cluster_store.heartbeat("worker-a", now=time.time() - 3600)
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(40, 5))
+    state = checkpoint(session_a)
+    ym.cluster_store.rebalance(ym.WORKER_TIMEOUT_SECONDS)
+    ym.classification_pool.discard(CHAT_ID)  # The process is gone
+
+    as_worker("worker-b")
+    session_b = new_session()
+    ym.process_chat_page(session_b, page(40, 5))
+
+    as_worker("worker-a")
+    restarted = ym.resume_chat_session(STREAM_IDS, state, time.time())
+    if restarted.pending or len(restarted.contested) != 5:
+        print(f"❌ Restarted worker A queued {len(restarted.pending)} messages held by B")
+        return False
+
+    as_worker("worker-b")
+    llm_released.set()
+    if not wait_for_verdicts(session_b):
+        print("❌ Worker B did not finish its messages")
+        return False
+    as_worker("worker-a")
+    ym.process_chat_page(restarted, {"items": []})  # Next poll, no new messages
+    if restarted.pending or restarted.contested:
+        print(f"❌ Restarted worker A took {len(restarted.pending)} messages B finished")
+        return False
+    print("✅ Only worker B moderated the 5 checkpointed messages")
+    return True
+
+
+def test_restart_keeps_own_claims():
+    """A restarts before its claims were released; it moderates its messages itself."""
+    print("♻️ Testing a restart from a checkpoint with the claims still held...")
+    llm_released.clear()
+    as_worker("worker-a")
+    session_a = new_session()
+    ym.process_chat_page(session_a, page(50, 5))
+    state = checkpoint(session_a)
+    ym.classification_pool.discard(CHAT_ID)  # The process is gone
+
+    restarted = ym.resume_chat_session(STREAM_IDS, state, time.time())
+    llm_released.set()
+    if len(restarted.pending) != 5 or not wait_for_verdicts(restarted):
+        print(f"❌ Restarted worker A queued {len(restarted.pending)} of its 5 messages")
+        return False
+    print("✅ Restarted worker A moderated its 5 checkpointed messages")
+    return True
+
+
+def main():
+    print("🧪 Cluster Failover Test")
+    print("=" * 50)
+    workdir = tempfile.mkdtemp(prefix="test_cluster_failover_")
+    ym.FEATURE_MODERATOR_ACTIVE = "LLM"
+    ym.CHAT_LOG_FILE = os.path.join(workdir, "chat_messages.log")
+    ym.LATENCY_SUMMARY_FILE = os.path.join(workdir, "moderation_latency.jsonl")
+    ym.moderate_message_with_llm = stub_llm
+    ym.classification_pool = ym.ClassificationPool(2)
+    ym.cluster_store = ClusterStore(os.path.join(workdir, "cluster.db"))
+
+    tests = [
+        test_handover_after_stop,
+        test_handover_while_old_worker_runs,
+        test_dead_worker,
+        test_finished_messages_not_redone,
+        test_restart_after_takeover,
+        test_restart_keeps_own_claims,
+    ]
+    results = []
+    for test in tests:
+        results.append(test())
+        print()
+    llm_released.set()
+
+    passed = sum(results)
+    print("=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    if passed == len(tests):
+        print("🎉 No message was lost or moderated twice on failover.")
+    else:
+        print("⚠️ Some failover tests failed.")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
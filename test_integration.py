@@ -10,7 +10,7 @@ import subprocess
 import sys
 import os
 
-API_BASE = "http://localhost:5000"
+API_BASE = "http://localhost:5555"
 STATS_FILE = "stats.json"
 
 
@@ -89,7 +89,7 @@ def test_animation_page():
     print("\n🎨 Testing animation page...")
 
     try:
-        response = requests.get(f"{API_BASE}/", timeout=5)
+        response = requests.get(f"{API_BASE}/anim/potuzhnist", timeout=5)
         if response.status_code == 200:
             content = response.text
             if "vertical-bar" in content.lower() and "updateBar" in content:
@@ -188,7 +188,7 @@ def main():
         print("\n📝 Next steps:")
         print("1. Start youtube_moderator.py to get real-time stats")
         print("2. Start animation-server.py to serve the animation")
-        print("3. Open http://localhost:5000 to view the animation")
+        print("3. Open http://localhost:5555/anim/potuzhnist to view the animation")
     else:
         print("❌ Some tests failed. Please check the errors above.")
         return 1
@@ -162,6 +162,22 @@ def test_animation_page():
         return False
 
 
+def test_history_bad_params():
+    """Test that non-finite history parameters are rejected as bad requests."""
+    print("\n📈 Testing history with non-finite parameters...")
+    try:
+        for params in ({"window": "inf"}, {"window": "nan"}, {"resolution": "nan"}):
+            response = requests.get(f"{API_BASE}/api/stats/history", params=params, timeout=5)
+            if response.status_code != 400:
+                print(f"❌ {params} returned {response.status_code} instead of 400")
+                return False
+        print("✅ inf and nan are rejected with 400")
+        return True
+    except Exception as e:
+        print(f"❌ Error testing history parameters: {e}")
+        return False
+
+
 def main():
     """Run all tests."""
     print("🧪 Testing In-Memory Stats System")
@@ -173,6 +189,7 @@ def main():
         ("Update Stats", test_update_stats),
         ("Partial Update", test_partial_update),
         ("Animation Page", test_animation_page),
+        ("History Parameters", test_history_bad_params),
     ]
 
     passed = 0
@@ -1,16 +1,32 @@
+import argparse
+import logging
 import os
+import socket
+import subprocess
 import sys
 import time
 import pickle
+import signal
 import json
-import requests  # For requests to the LM Studio API
 import csv
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from googleapiclient.errors import HttpError
 
+from moderation_checkpoint import ModerationCheckpoint, RecentIds
+from moderation_latency import MessageTiming, StreamLatency
+from moderation_logging import setup_logging
+from moderation_overload import OverloadController
+from moderation_pool import ClassificationPool, VerdictCache
+
+# requests, the Google auth/discovery stack, the cluster store and the stats
+# publisher are imported where they are first used: together they take
+# several hundred milliseconds to import, and the benchmark scripts that
+# import this module do not need them
+
 
 # --- CONFIGURATIONS ---
 CLIENT_SECRET_FILE = "client_secret.json"  # Path to your client_secret.json
@@ -65,18 +81,145 @@ FEATURE_AD_BREAK_ACTIVE = True  # Enable/disable ad break functionality
 AD_BREAK_DURATION_SECONDS = 30  # Duration for ad placement in stream settings
 
 # Stream statistics configuration
-STATS_UPDATE_INTERVAL_SECONDS = 30  # Update stats every 30 seconds
+STATS_UPDATE_INTERVAL_SECONDS = 30  # Update stats every 30 seconds while viewers change
+STATS_MAX_INTERVAL_SECONDS = 120  # Slowest stats polling while viewers are stable
+STATS_BACKOFF_FACTOR = 1.5  # Interval growth per poll without a viewer change
+STATS_VIEWERS_CHANGE_RATIO = 0.05  # Viewer change that resets the interval
 FEATURE_STATS_ACTIVE = True  # Enable/disable stats fetching functionality
+STATS_API_URL = "http://localhost:5555/api/update-stats"  # animation-server.py
+STATS_RESEND_SECONDS = 120  # Unchanged stats are still resent this often, for a restarted server
+
+# Multi-stream configuration: every live broadcast of the channel is moderated
+# by this process, with one classification pool shared by all chats
+CLASSIFICATION_WORKERS = 4  # Messages classified in parallel across all chats
+VERDICT_CACHE_SIZE = 10000  # Message texts whose LLM verdict is remembered
+DISCOVERY_INTERVAL_SECONDS = POLL_INTERVAL_SECONDS * 5  # How often to look for new streams
+LOOP_TICK_SECONDS = 1  # Main loop period while verdicts are still being computed
+DISCOVERY_CACHE_SECONDS = 120  # How long a found set of live streams is reused
+
+# YouTube API transport: every thread has its own authorized connection
+API_WORKERS = 4  # Deletes, promo posts, ad breaks and stats calls run in parallel
+API_TIMEOUT_SECONDS = 30  # Socket timeout of one API request
+TOKEN_REFRESH_MARGIN_SECONDS = 300  # The OAuth token is renewed this long before it expires
+
+# Classification order within a chat: oldest first, with each risk point
+# moving a message ahead as if it had been posted PRIORITY_RISK_SECONDS earlier
+PRIORITY_RISK_SECONDS = 10
+PRIORITY_LONG_MESSAGE_CHARS = 150  # Longer messages get a risk point
+
+# Load shedding in LLM mode when chat outpaces classification (moderation_overload)
+FEATURE_OVERLOAD_ACTIVE = True
+OVERLOAD_SAMPLING_BACKLOG = 50  # Queued messages that switch to sampling
+OVERLOAD_CACHE_ONLY_BACKLOG = 200  # Queued messages that stop new LLM requests
+OVERLOAD_QUEUE_WAIT_SECONDS = 15  # Wait for a classification worker that switches to sampling
+OVERLOAD_RECOVER_BACKLOG = 10  # Backlog at or below which load counts as down
+OVERLOAD_RECOVER_SECONDS = 30  # How long load must stay down before each step back
+OVERLOAD_MAX_MESSAGE_AGE_SECONDS = 60  # Older messages are skipped while degraded, deleting them is pointless
+OVERLOAD_SAMPLE_RATE = 0.2  # Share of low-risk messages still classified while sampling
+OVERLOAD_MIN_RISK = 2  # Messages with this many risk points are always classified
+
+# Partial responses: each API call downloads only the fields the code reads
+BROADCASTS_LIST_FIELDS = "etag,nextPageToken,items(id,snippet(liveChatId,title))"
+CHAT_MESSAGES_FIELDS = (
+    "nextPageToken,pollingIntervalMillis,"
+    "items(id,snippet(displayMessage,publishedAt),"
+    "authorDetails(channelId,displayName,isChatOwner,isChatModerator))"
+)
+VIDEO_METADATA_FIELDS = (
+    "items(snippet(title,channelTitle),"
+    "liveStreamingDetails(actualStartTime,scheduledStartTime))"
+)
+VIDEO_COUNTERS_FIELDS = (
+    "etag,items(liveStreamingDetails(concurrentViewers,actualEndTime),"
+    "statistics(viewCount,likeCount,commentCount))"
+)
+# liveBroadcasts.update replaces the parts it is sent, so every writable
+# property of them has to be read back first
+BROADCAST_SETTINGS_FIELDS = (
+    "items(id,snippet(title,description,scheduledStartTime,scheduledEndTime),"
+    "contentDetails,status(privacyStatus,selfDeclaredMadeForKids))"
+)
+BROADCAST_UPDATE_FIELDS = "contentDetails/enableAutoAdPlacement"
+WRITE_RESPONSE_FIELDS = "id"  # Inserted messages and cuepoints are not read back
+
+# Cluster configuration (--role coordinator / worker): the coordinator assigns
+# live chats to worker processes that share state through CLUSTER_STORE_FILE
+CLUSTER_STORE_FILE = "moderation_cluster.db"
+CLUSTER_WORKERS = 2  # Local worker processes started by the coordinator
+WORKER_SYNC_SECONDS = 2  # How often a worker heartbeats and reads its assignments
+WORKER_TIMEOUT_SECONDS = 30  # Silence after which a worker's chats are reassigned
+COORDINATOR_TICK_SECONDS = 2  # How often the coordinator rebalances
+CLAIM_RETENTION_SECONDS = 3600  # How long handled message IDs are remembered
+
+# Checkpoints of per-chat cursors, handled IDs and timers for warm restarts
+CHECKPOINT_FILE = "moderation_checkpoint.json"
+CHECKPOINT_INTERVAL_SECONDS = 5  # How often the checkpoint is rewritten
+CHECKPOINT_MAX_AGE_SECONDS = 6 * 3600  # Older chats are not resumed
+PROCESSED_IDS_LIMIT = 5000  # Handled message IDs remembered per chat
+
+# Logging: written by a background thread so a slow terminal never stalls moderation
+LOG_LEVEL = "INFO"  # DEBUG also shows sampled per-message lines
+LOG_DEBUG_SAMPLE_EVERY = 100  # Keep one in N per-message debug lines
+LOG_QUEUE_SIZE = 10000  # Records buffered before new ones are dropped
+
+# Moderation latency, from a message's publishedAt to its deletion
+LATENCY_REPORT_INTERVAL_SECONDS = 60  # How often p50/p95/p99 of each chat are logged
+LATENCY_ALERT_SECONDS = 30  # Warn when p95 exposure of removed messages exceeds this
+LATENCY_SUMMARY_FILE = "moderation_latency.jsonl"  # One summary line per ended or cut short stream
+
+# Profiling (--profile, or send SIGUSR1 to start/stop a running moderator)
+PROFILE_DIR = "profiles"  # Each profiling run writes to its own subdirectory
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.01  # Stack sampling period
+PROFILE_MEMORY_INTERVAL_SECONDS = 60  # How often memory is snapshotted while profiling
+
+# Per-message trace spans (OpenTelemetry OTLP/JSON lines)
+TRACE_FILE = "moderation_traces.jsonl"  # Summarize with: python moderation_tracing.py
+TRACE_SAMPLE_RATE = 0.01  # Share of messages traced; 0 traces only slow ones
+TRACE_SLOW_SECONDS = 30  # Messages whose verdict took longer are always traced
+FEATURE_TRACING_ACTIVE = True
+
+# Shadow evaluation: a candidate prompt/model classifies a sample of live
+# messages in the background and disagreements with production are logged
+FEATURE_SHADOW_ACTIVE = False
+SHADOW_PROMPT_FILE = "best_context.txt"  # Candidate system prompt, e.g. from train_moderator.py
+SHADOW_MODEL_NAME = None  # Candidate model, None for LLM_MODEL_NAME
+SHADOW_SAMPLE_RATE = 0.1  # Share of LLM-moderated messages also given to the candidate
+SHADOW_MAX_PENDING = 4  # Candidate requests in flight before messages are skipped
+SHADOW_LOG_FILE = "shadow_disagreements.csv"
 
 # Stream statistics configuration
 COMMENT_LOGIN_PHRASE = "Путин Хуйло"
 AUTHORIZED_USERS_FILE = "authorized_users.txt"
 CHAT_LOG_FILE = "chat_messages.log"
+# Searchable archive of all moderated messages (query: python moderation_archive.py)
+FEATURE_ARCHIVE_ACTIVE = True
+CHAT_ARCHIVE_FILE = "chat_archive.db"
+ARCHIVE_BATCH_SIZE = 500  # Messages written per transaction
+ARCHIVE_FLUSH_SECONDS = 1  # Longest a message waits before its batch is written
+
+logger = logging.getLogger("youtube_moderator")
 
-# Variable to store IDs of already processed messages to avoid re-checking them
-processed_message_ids = set()
 last_poll_time = None
 authorized_users = set()
+classification_pool = None  # ClassificationPool, created in main()
+overload_controller = None  # OverloadController shedding LLM work, created in moderate_streams()
+verdict_cache = None  # VerdictCache shared by all chats, created in main()
+cluster_store = None  # ClusterStore when running as a cluster worker or coordinator
+cluster_worker_id = None  # ID of this process when running as a cluster worker
+moderation_checkpoint = None  # ModerationCheckpoint, created in main()
+stream_discovery = None  # StreamDiscovery cache, created in main()
+stats_publisher = None  # StatsPublisher sending stats in the background
+api_executor = None  # ThreadPoolExecutor running YouTube API actions, created in moderate_streams()
+credential_refresher = None  # CredentialRefresher renewing the OAuth token
+api_http = None  # PooledHttp of the YouTube client, created in build_youtube()
+profiler = None  # Profiler, created in main()
+message_tracer = None  # MessageTracer writing trace spans, created in main()
+shadow_evaluator = None  # ShadowEvaluator of the candidate prompt, created in main()
+chat_archive = None  # ChatArchive of every moderated message, created in main()
+log_handler = None  # DroppingQueueHandler counting dropped log records, created in main()
+log_dropped_reported = 0  # Dropped log records already reported
+video_metadata = {}  # video_id -> title, channel and schedule, fetched once
+video_counters = {}  # video_id -> (ETag, viewer counts and statistics) of the last poll
 
 ## COMMENT LOGIN FEATURE ########################################################
 
@@ -90,42 +233,43 @@ def load_authorized_users():
                 user = line.strip()
                 if user:
                     authorized_users.add(user)
-        print(authorized_users)
-        print(f"✅ Loaded {len(authorized_users)} authorized users.")
+        logger.info(f"✅ Loaded {len(authorized_users)} authorized users.")
     else:
-        print("ℹ️ No authorization file found. Starting empty.")
-
-
-load_authorized_users()
+        logger.info("ℹ️ No authorization file found. Starting empty.")
 
 
 def save_authorized_user(user_id):
     """Add user to authorized list and persist to file."""
     global authorized_users
     authorized_users.add(user_id)
+    if cluster_store is not None:
+        cluster_store.add_authorized_users([user_id])
     with open(AUTHORIZED_USERS_FILE, "a", encoding="utf-8") as f:
         f.write(user_id + "\n")
-    print(f"✅ Added '{user_id}' to authorized users and saved.")
+    logger.info(f"✅ Added '{user_id}' to authorized users and saved.")
 
 
 def moderate_message_with_login(user_id, msg, item):
-    if item["authorDetails"].get("isChatOwner") or item["authorDetails"].get(
-        "isChatModerator"
-    ):
-        print("Admin")
+    author_details = item.get("authorDetails", {})
+    if author_details.get("isChatOwner") or author_details.get("isChatModerator"):
         return
 
-    print(user_id, COMMENT_LOGIN_PHRASE.lower(), "|||", msg.lower(), authorized_users)
+    # Users may have logged in through a chat moderated by another worker
+    if (
+        user_id not in authorized_users
+        and cluster_store is not None
+        and cluster_store.is_authorized(user_id)
+    ):
+        authorized_users.add(user_id)
 
     if user_id not in authorized_users:
-        print("1")
         if COMMENT_LOGIN_PHRASE.lower() in msg.lower():
-            print("2")
             save_authorized_user(user_id)
-            print(authorized_users)
             return ""
         else:
-            print("DELETE")
+            logger.debug(
+                "Not logged in", extra={"sample": True, "context": {"user": user_id}}
+            )
             return "DELETE"
     else:
         return ""
@@ -141,11 +285,13 @@ def log_chat_message(user_id, user_name, message_text, is_removed):
             writer = csv.writer(log_file)
             writer.writerow([user_id, user_name, message_text, bool(is_removed)])
     except Exception as e:
-        print(f"⚠️ Failed to log chat message: {e}")
+        logger.warning(f"⚠️ Failed to log chat message: {e}")
 
 
 def authenticate_youtube():
     """Authenticate via OAuth 2.0 and get the YouTube API service."""
+    global credential_refresher
+
     creds = None
     if os.path.exists(TOKEN_PICKLE_FILE):
         with open(TOKEN_PICKLE_FILE, "rb") as token:
@@ -153,75 +299,160 @@ def authenticate_youtube():
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
+
             creds.refresh(Request())
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
             flow = InstalledAppFlow.from_client_secrets_file(
                 CLIENT_SECRET_FILE, REQUIRED_SCOPES
             )
             creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE_FILE, "wb") as token:
-            pickle.dump(creds, token)
+        save_credentials(creds)
+
+    if creds.refresh_token:
+        from youtube_transport import CredentialRefresher
+
+        # Renew the token before it expires instead of inside an API call
+        credential_refresher = CredentialRefresher(
+            creds, margin=TOKEN_REFRESH_MARGIN_SECONDS, on_refresh=save_credentials
+        )
+    return build_youtube(creds)
+
+
+def save_credentials(creds):
+    """Store the OAuth token, replacing the file atomically (workers share it)."""
+    tmp_path = f"{TOKEN_PICKLE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as token:
+        pickle.dump(creds, token)
+    os.replace(tmp_path, TOKEN_PICKLE_FILE)
+
+
+def build_youtube(creds):
+    """
+    YouTube API client built from the discovery document bundled with
+    google-api-python-client, so no discovery request is made at startup.
+
+    Requests go through a PooledHttp, so the client can be used from several
+    threads at once.
+    """
+    global api_http
+    from googleapiclient.discovery import build
+    from youtube_transport import PooledHttp
+
+    api_http = PooledHttp(creds, timeout=API_TIMEOUT_SECONDS)
+    return build(
+        "youtube",
+        "v3",
+        http=api_http,
+        static_discovery=True,
+        cache_discovery=False,
+    )
+
+
+class StreamDiscovery:
+    """Last discovery result, reused until it expires and revalidated by ETag."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.streams = None
+        self.etag = None
+        self.expires_at = 0
 
-    return build("youtube", "v3", credentials=creds)
+    def store(self, streams, etag, now):
+        self.streams = streams
+        self.etag = etag
+        # Nothing live: keep checking on every call so a new stream is found
+        # quickly, the ETag still makes unchanged answers cheap
+        self.expires_at = now + self.ttl if streams else now
+
+    def invalidate(self):
+        """Look the streams up again on the next call, e.g. after a chat failed."""
+        self.expires_at = 0
 
 
 def get_active_stream_ids(youtube):
-    """Finds the user's active stream and returns its chat ID, broadcast ID, and video ID."""
+    """
+    Finds all of the user's live streams.
+
+    Only active broadcasts are requested, so the cost does not depend on how
+    many past broadcasts the channel has. With `stream_discovery` set the
+    result is cached and revalidated with If-None-Match.
+
+    Returns:
+        list: (live chat ID, broadcast ID, video ID) of every live broadcast,
+        empty if none is live, or None if the search failed.
+    """
+    cache = stream_discovery
+    now = time.time()
+    if cache is not None and cache.streams is not None and now < cache.expires_at:
+        return cache.streams
+
     try:
-        print("🔍 Searching for user broadcasts...")
+        logger.info("🔍 Searching for active broadcasts...")
         page_token = None
-        active_broadcast = None
+        active_broadcasts = []
+        etag = None
 
         while True:
             request = youtube.liveBroadcasts().list(
-                part="snippet,contentDetails,status",
-                mine=True,  # Request all user broadcasts
+                part="id,snippet",
+                broadcastStatus="active",  # Filtered by the server, implies mine=True
+                broadcastType="all",
                 maxResults=50,
                 pageToken=page_token,
+                fields=BROADCASTS_LIST_FIELDS,
             )
-            response = request.execute()
-
-            if not response.get("items"):
-                if response.get("nextPageToken"):
-                    page_token = response["nextPageToken"]
-                    continue
-                print("😕 No user broadcasts found.")
-                return None
-
-            for broadcast_item in response.get("items", []):
-                # Check broadcast status to find the active one
-                # 'live' status means the broadcast is currently live
-                # Can also check broadcast_item['status']['recordingStatus'] == 'recording'
-                if broadcast_item.get("status", {}).get("lifeCycleStatus") == "live":
-                    active_broadcast = broadcast_item
-                    break  # Found an active broadcast
-
-            if active_broadcast or not response.get("nextPageToken"):
+            conditional = (
+                page_token is None and cache is not None and cache.etag is not None
+            )
+            if conditional:
+                request.headers["If-None-Match"] = cache.etag
+            try:
+                response = request.execute()
+            except HttpError as e:
+                if conditional and e.resp.status == 304:
+                    logger.info("🔍 Active broadcasts unchanged.")
+                    cache.store(cache.streams, cache.etag, now)
+                    return cache.streams
+                raise
+
+            active_broadcasts.extend(response.get("items", []))
+            if page_token is None:
+                etag = response.get("etag")
+
+            if not response.get("nextPageToken"):
                 break
-
             page_token = response.get("nextPageToken")
+            etag = None  # A multi-page answer cannot be revalidated as a whole
 
-        if not active_broadcast:
-            print("😕 No active streams found among user broadcasts.")
-            return None
-
-        live_chat_id = active_broadcast["snippet"]["liveChatId"]
-        broadcast_id = active_broadcast["id"]
-        video_id = active_broadcast["id"]  # videoId is the same as the broadcast id
-        stream_title = active_broadcast["snippet"]["title"]
-        print(
-            f"🟢 Active stream found: '{stream_title}' (Live Chat ID: {live_chat_id}, Broadcast ID: {broadcast_id}, Video ID: {video_id})"
-        )
-        return live_chat_id, broadcast_id, video_id
+        streams = []
+        for active_broadcast in active_broadcasts:
+            live_chat_id = active_broadcast["snippet"].get("liveChatId")
+            if not live_chat_id:
+                continue  # Live without a chat: nothing to moderate
+            broadcast_id = active_broadcast["id"]
+            video_id = active_broadcast["id"]  # videoId is the same as the broadcast id
+            stream_title = active_broadcast["snippet"]["title"]
+            logger.info(
+                f"🟢 Active stream found: '{stream_title}' (Live Chat ID: {live_chat_id}, Broadcast ID: {broadcast_id}, Video ID: {video_id})"
+            )
+            streams.append((live_chat_id, broadcast_id, video_id))
+        if not streams:
+            logger.info("😕 No active streams found among user broadcasts.")
+        if cache is not None:
+            cache.store(streams, etag, now)
+        return streams
     except HttpError as e:
-        print(f"YouTube API error while searching for active stream: {e}")
+        logger.error(f"YouTube API error while searching for active stream: {e}")
         # Add error details if available
         if e.error_details:
             for detail in e.error_details:
-                print(f"  - {detail['reason']}: {detail['message']}")
+                logger.error(f"  - {detail['reason']}: {detail['message']}")
         return None
     except Exception as e:
-        print(f"Unknown error while searching for active stream: {e}")
+        logger.error(f"Unknown error while searching for active stream: {e}")
         return None
 
 
@@ -231,74 +462,109 @@ def get_live_chat_messages(youtube, live_chat_id, page_token=None):
     try:
         request = youtube.liveChatMessages().list(
             liveChatId=live_chat_id,
-            part="snippet,authorDetails,id",
+            part="snippet,authorDetails",
             maxResults=200,  # Maximum number of messages per request
             pageToken=page_token,
+            fields=CHAT_MESSAGES_FIELDS,
         )
         response = request.execute()
         return response
     except HttpError as e:
         if e.resp.status == 403 and "disabled" in str(e).lower():
-            print(f"🔴 Error: Chat for this stream is disabled or unavailable. ({e})")
+            logger.error(f"🔴 Error: Chat for this stream is disabled or unavailable. ({e})")
             return None
-        print(f"YouTube API error while retrieving messages: {e}")
+        logger.error(f"YouTube API error while retrieving messages: {e}")
         return None
     except Exception as e:
-        print(f"Unknown error while retrieving messages: {e}")
+        logger.error(f"Unknown error while retrieving messages: {e}")
         return None
 
 
-def moderate_message_with_llm(message_text):
-    """Sends a message to the local LLM for moderation."""
-    if not message_text:
-        return "KEEP"  # Empty messages are considered safe
+def request_llm(message_text, system_prompt, model):
+    """Ask the LLM to classify one message. Returns the decoded chat completion."""
+    import requests
 
     payload = {
-        "model": LLM_MODEL_NAME,
+        "model": model,
         "messages": [
-            {"role": "system", "content": LLM_SYSTEM_PROMPT},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": message_text},
         ],
         "temperature": 0.1,  # Low temperature for more deterministic responses
         "max_tokens": 10,  # "DELETE" or "KEEP" - short responses
     }
+    response = requests.post(LMSTUDIO_API_URL, json=payload, timeout=30)
+    response.raise_for_status()  # Check for HTTP errors
+    return response.json()
+
+
+def moderate_message_with_llm(message_text):
+    """Sends a message to the local LLM for moderation."""
+    import requests  # For requests to the LM Studio API
+
+    if not message_text:
+        return "KEEP"  # Empty messages are considered safe
+
+    # The same text posted in any chat gets the same verdict
+    if verdict_cache is not None:
+        cached_decision = verdict_cache.get(message_text)
+        if cached_decision:
+            logger.debug(
+                "🤖 Cached decision: '%s' for message: '%s'",
+                cached_decision,
+                message_text,
+                extra={"sample": True},
+            )
+            return cached_decision
+
+    llm_response = None
     try:
-        response = requests.post(
-            LMSTUDIO_API_URL, json=payload, timeout=30
-        )  # timeout 30 seconds
-        response.raise_for_status()  # Check for HTTP errors
-        llm_response = response.json()
+        llm_response = request_llm(message_text, LLM_SYSTEM_PROMPT, LLM_MODEL_NAME)
         decision = llm_response["choices"][0]["message"]["content"].strip().upper()
-        print(
-            f"🤖 LLM ({LLM_MODEL_NAME}) decided: '{decision}' for message: '{message_text}'"
+        logger.debug(
+            "🤖 LLM (%s) decided: '%s' for message: '%s'",
+            LLM_MODEL_NAME,
+            decision,
+            message_text,
+            extra={"sample": True},
         )
         if decision not in ["DELETE", "KEEP"]:
-            print(
+            logger.warning(
                 f"⚠️ Unexpected response from LLM: '{decision}'. Defaulting to 'KEEP'."
             )
             return "DELETE"
+        if verdict_cache is not None:
+            verdict_cache.put(message_text, decision)
         return decision
     except requests.exceptions.RequestException as e:
-        print(f"Connection error with LM Studio API: {e}")
+        logger.error(f"Connection error with LM Studio API: {e}")
         return "KEEP"  # If LLM is unavailable, do not delete the message
     except KeyError:
-        print(f"Error: Invalid response format from LLM: {llm_response}")
+        logger.error(f"Error: Invalid response format from LLM: {llm_response}")
         return "KEEP"
     except Exception as e:
-        print(f"Unknown error interacting with LLM: {e}")
+        logger.error(f"Unknown error interacting with LLM: {e}")
         return "KEEP"
 
 
+def classify_with_candidate(message_text, system_prompt, model):
+    """Shadow classifier: the candidate's verdict, bypassing the verdict cache."""
+    llm_response = request_llm(message_text, system_prompt, model)
+    decision = llm_response["choices"][0]["message"]["content"].strip().upper()
+    # Unexpected answers count as DELETE, like in moderate_message_with_llm()
+    return decision if decision in ("DELETE", "KEEP") else "DELETE"
+
+
 def delete_chat_message(youtube, message_id):
     """Deletes a message from YouTube chat."""
     try:
         youtube.liveChatMessages().delete(id=message_id).execute()
-        print(f"🗑️ Message {message_id} successfully deleted.")
+        logger.info("🗑️ Message %s successfully deleted.", message_id)
         return True
     except HttpError as e:
-        print(f"YouTube API error when deleting message {message_id}: {e}")
+        logger.error(f"YouTube API error when deleting message {message_id}: {e}")
     except Exception as e:
-        print(f"Unknown error when deleting message {message_id}: {e}")
+        logger.error(f"Unknown error when deleting message {message_id}: {e}")
     return False
 
 
@@ -312,14 +578,16 @@ def post_message(youtube, live_chat_id, message_text=AD_MESSAGE_TEXT):
                 "textMessageDetails": {"messageText": message_text},
             }
         }
-        youtube.liveChatMessages().insert(part="snippet", body=body).execute()
-        print("📣 Posted promotional message to chat.")
+        youtube.liveChatMessages().insert(
+            part="snippet", body=body, fields=WRITE_RESPONSE_FIELDS
+        ).execute()
+        logger.info("📣 Posted promotional message to chat.")
         return True
     except HttpError as e:
-        print(f"YouTube API error when posting promo message: {e}")
+        logger.error(f"YouTube API error when posting promo message: {e}")
         return False
     except Exception as e:
-        print(f"Unknown error when posting promo message: {e}")
+        logger.error(f"Unknown error when posting promo message: {e}")
         return False
 
 
@@ -335,22 +603,23 @@ def trigger_ad_break(youtube, broadcast_id):
     body = {"cueType": "cueTypeAd", "durationSecs": int(AD_BREAK_DURATION_SECONDS)}
 
     try:
-        print(body)
         result = (
             youtube.liveBroadcasts()
             .insertCuepoint(
-                id=broadcast_id, body=body, part="snippet,contentDetails,status"
+                id=broadcast_id,
+                body=body,
+                part="snippet,contentDetails,status",
+                fields=WRITE_RESPONSE_FIELDS,
             )
             .execute()
         )
-        print(result)
-        print("📺 Ad cuepoint inserted.")
+        logger.info(f"📺 Ad cuepoint inserted: {result}")
         return True
     except HttpError as e:
-        print(f"YouTube API error when triggering ad break: {e}")
+        logger.error(f"YouTube API error when triggering ad break: {e}")
         return False
     except Exception as e:
-        print(f"Unknown error when triggering ad break: {e}")
+        logger.error(f"Unknown error when triggering ad break: {e}")
         return False
 
 
@@ -365,13 +634,20 @@ def enable_auto_ad_placement(youtube, broadcast_id):
     """
     try:
         # Get current broadcast details
-        broadcast_request = youtube.liveBroadcasts().get(
-            id=broadcast_id, part="snippet,contentDetails,status"
+        broadcast_request = youtube.liveBroadcasts().list(
+            id=broadcast_id,
+            part="snippet,contentDetails,status",
+            fields=BROADCAST_SETTINGS_FIELDS,
         )
-        current_broadcast = broadcast_request.execute()
+        broadcasts = broadcast_request.execute().get("items", [])
+        if not broadcasts:
+            logger.error(f"❌ No broadcast found with ID: {broadcast_id}")
+            return False
+        current_broadcast = broadcasts[0]
 
         # Prepare updated settings for automatic ad placement
         updated_settings = {
+            "id": broadcast_id,
             "snippet": current_broadcast["snippet"],
             "contentDetails": current_broadcast["contentDetails"],
             "status": current_broadcast["status"],
@@ -389,26 +665,107 @@ def enable_auto_ad_placement(youtube, broadcast_id):
 
         # Update the broadcast with new settings
         update_request = youtube.liveBroadcasts().update(
-            part="snippet,contentDetails,status", body=updated_settings
+            part="snippet,contentDetails,status",
+            body=updated_settings,
+            fields=BROADCAST_UPDATE_FIELDS,
         )
         result = update_request.execute()
 
-        print(
+        logger.info(
             f"📺 Stream settings updated for automatic ad placement (duration: {AD_BREAK_DURATION_SECONDS}s)"
         )
-        print(
+        logger.info(
             f"🔄 Auto ad placement enabled: {result.get('contentDetails', {}).get('enableAutoAdPlacement', False)}"
         )
         return True
 
     except HttpError as e:
-        print(f"YouTube API error when modifying stream settings: {e}")
+        logger.error(f"YouTube API error when modifying stream settings: {e}")
         return False
     except Exception as e:
-        print(f"Unknown error when modifying stream settings: {e}")
+        logger.error(f"Unknown error when modifying stream settings: {e}")
         return False
 
 
+def get_video_metadata(youtube, video_id):
+    """
+    Title, channel and schedule of a live video.
+
+    They do not change during a stream, so they are requested once per video.
+
+    Returns:
+        dict: the metadata, or None if the video is not a live stream
+    """
+    metadata = video_metadata.get(video_id)
+    if metadata is not None:
+        return metadata
+
+    request = youtube.videos().list(
+        part="snippet,liveStreamingDetails",
+        id=video_id,
+        fields=VIDEO_METADATA_FIELDS,
+    )
+    response = request.execute()
+    if not response.get("items"):
+        logger.error(f"❌ No video found with ID: {video_id}")
+        return None
+
+    video = response["items"][0]
+    # Check if it's a live stream
+    if "liveStreamingDetails" not in video:
+        logger.warning("⚠️ This video is not a live stream")
+        return None
+
+    live_details = video["liveStreamingDetails"]
+    snippet = video.get("snippet", {})
+    metadata = {
+        "title": snippet.get("title", "N/A"),
+        "channel_title": snippet.get("channelTitle", "N/A"),
+        "actual_start_time": live_details.get("actualStartTime"),
+        "scheduled_start_time": live_details.get("scheduledStartTime"),
+    }
+    video_metadata[video_id] = metadata
+    return metadata
+
+
+def get_video_counters(youtube, video_id):
+    """
+    Viewer count and statistics of a live video.
+
+    Revalidated with the ETag of the previous answer, so an unchanged video
+    costs a 304 without a body.
+
+    Returns:
+        dict: liveStreamingDetails and statistics, or None if the video is gone
+    """
+    request = youtube.videos().list(
+        part="liveStreamingDetails,statistics",
+        id=video_id,
+        fields=VIDEO_COUNTERS_FIELDS,
+    )
+    cached = video_counters.get(video_id)
+    conditional = cached is not None and bool(cached[0])  # Responses may lack an ETag
+    if conditional:
+        request.headers["If-None-Match"] = cached[0]
+    try:
+        response = request.execute()
+    except HttpError as e:
+        if conditional and e.resp.status == 304:
+            return cached[1]
+        raise
+
+    if not response.get("items"):
+        logger.error(f"❌ No video found with ID: {video_id}")
+        return None
+    video = response["items"][0]
+    counters = {
+        "liveStreamingDetails": video.get("liveStreamingDetails", {}),
+        "statistics": video.get("statistics", {}),
+    }
+    video_counters[video_id] = (response.get("etag"), counters)
+    return counters
+
+
 def get_stream_statistics(youtube, video_id):
     """
     Get live stream statistics including concurrent viewers and total views using YouTube Data API v3.
@@ -422,305 +779,1096 @@ def get_stream_statistics(youtube, video_id):
         dict: Dictionary containing online_viewers and total_views
     """
     try:
-        # Request video details with live streaming info and statistics
-        request = youtube.videos().list(
-            part="liveStreamingDetails,statistics,snippet", id=video_id
-        )
-        response = request.execute()
-
-        if not response["items"]:
-            print(f"❌ No video found with ID: {video_id}")
+        metadata = get_video_metadata(youtube, video_id)
+        if metadata is None:
             return None
-
-        video = response["items"][0]
-
-        # Check if it's a live stream
-        if "liveStreamingDetails" not in video:
-            print("⚠️ This video is not a live stream")
+        counters = get_video_counters(youtube, video_id)
+        if counters is None:
             return None
 
-        live_details = video["liveStreamingDetails"]
-        statistics = video["statistics"]
-        snippet = video["snippet"]
+        live_details = counters["liveStreamingDetails"]
+        statistics = counters["statistics"]
 
         # Extract concurrent viewers from live streaming details
         concurrent_viewers = live_details.get("concurrentViewers")
-        if concurrent_viewers is not None:
-            concurrent_viewers = int(concurrent_viewers)
-        else:
-            print("⚠️ No concurrent viewers data available (stream may not be live)")
-            concurrent_viewers = 0
+        if concurrent_viewers is None:
+            logger.warning("⚠️ No concurrent viewers data available (stream may not be live)")
 
         stats = {
             "video_id": video_id,
-            "title": snippet.get("title", "N/A"),
-            "channel_title": snippet.get("channelTitle", "N/A"),
-            "concurrent_viewers": live_details.get("concurrentViewers"),
-            "actual_start_time": live_details.get("actualStartTime"),
-            "scheduled_start_time": live_details.get("scheduledStartTime"),
+            "title": metadata["title"],
+            "channel_title": metadata["channel_title"],
+            "concurrent_viewers": concurrent_viewers,
+            "actual_start_time": metadata["actual_start_time"],
+            "scheduled_start_time": metadata["scheduled_start_time"],
             "is_live": "actualEndTime" not in live_details,
             "total_views": statistics.get("viewCount"),
             "likes": statistics.get("likeCount"),
             "comments": statistics.get("commentCount"),
         }
 
-        print(
+        logger.info(
             f"📊 Stream stats - Concurrent viewers: {stats['concurrent_viewers']}, Total views: {stats['total_views']}"
         )
         return stats
 
     except HttpError as e:
-        print(f"❌ YouTube API error when getting stream statistics: {e}")
+        logger.error(f"❌ YouTube API error when getting stream statistics: {e}")
         return None
     except Exception as e:
-        print(f"❌ Unknown error when getting stream statistics: {e}")
+        logger.error(f"❌ Unknown error when getting stream statistics: {e}")
         return None
 
 
+def next_stats_interval(interval, previous_viewers, viewers):
+    """
+    Poll stats less often while the viewer count is stable.
+
+    The interval grows by STATS_BACKOFF_FACTOR per poll up to
+    STATS_MAX_INTERVAL_SECONDS, and drops back to
+    STATS_UPDATE_INTERVAL_SECONDS as soon as viewers change noticeably.
+    """
+    if previous_viewers is None or viewers is None:
+        return STATS_UPDATE_INTERVAL_SECONDS
+    change = abs(viewers - previous_viewers) / max(previous_viewers, 1)
+    if change >= STATS_VIEWERS_CHANGE_RATIO:
+        return STATS_UPDATE_INTERVAL_SECONDS
+    return min(STATS_MAX_INTERVAL_SECONDS, interval * STATS_BACKOFF_FACTOR)
+
+
 def update_stats_via_api(stats):
     """
-    Update stats via the animation server API.
+    Queue stats for the animation server API.
+
+    The stats are sent by `stats_publisher` in the background, so this never
+    waits for the server. Unchanged stats are not sent again.
 
     Args:
         stats: Dictionary containing the statistics to save
     """
-    try:
-        # Convert the detailed stats to the format expected by the API
-        api_stats = {
-            "online_viewers": (
-                int(stats.get("concurrent_viewers", 0))
-                if stats.get("concurrent_viewers")
-                else 0
-            ),
-            "total_views": (
-                int(stats.get("total_views", 0)) if stats.get("total_views") else 0
-            ),
-            "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            # Additional fields for the server
-            "video_id": stats.get("video_id", ""),
-            "title": stats.get("title", "N/A"),
-            "channel_title": stats.get("channel_title", "N/A"),
-            "actual_start_time": stats.get("actual_start_time", ""),
-            "scheduled_start_time": stats.get("scheduled_start_time", ""),
-            "is_live": stats.get("is_live", False),
-            "likes": int(stats.get("likes", 0)) if stats.get("likes") else 0,
-            "comments": int(stats.get("comments", 0)) if stats.get("comments") else 0,
-        }
+    # Convert the detailed stats to the format expected by the API
+    api_stats = {
+        "online_viewers": (
+            int(stats.get("concurrent_viewers", 0))
+            if stats.get("concurrent_viewers")
+            else 0
+        ),
+        "total_views": (
+            int(stats.get("total_views", 0)) if stats.get("total_views") else 0
+        ),
+        "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        # Additional fields for the server
+        "video_id": stats.get("video_id", ""),
+        "title": stats.get("title", "N/A"),
+        "channel_title": stats.get("channel_title", "N/A"),
+        "actual_start_time": stats.get("actual_start_time", ""),
+        "scheduled_start_time": stats.get("scheduled_start_time", ""),
+        "is_live": stats.get("is_live", False),
+        "likes": int(stats.get("likes", 0)) if stats.get("likes") else 0,
+        "comments": int(stats.get("comments", 0)) if stats.get("comments") else 0,
+    }
+    stats_publisher.publish(api_stats)
+    return True
+
+
+@dataclass
+class ChatSession:
+    """Moderation state of one live chat, polled on its own schedule."""
+
+    live_chat_id: str
+    broadcast_id: str
+    video_id: str
+    next_page_token: str = None
+    # IDs of recently processed messages to avoid re-checking them
+    processed_message_ids: RecentIds = field(
+        default_factory=lambda: RecentIds(PROCESSED_IDS_LIMIT)
+    )
+    # Authors seen in this chat, a first message is riskier
+    known_authors: RecentIds = field(
+        default_factory=lambda: RecentIds(PROCESSED_IDS_LIMIT)
+    )
+    # Messages waiting for a verdict:
+    # (message_id, channel_id, name, text, Future, MessageTiming)
+    pending: list = field(default_factory=list)
+    # (item, fetched_at) of messages another worker claimed but has not
+    # finished, retried until that worker finishes or releases them
+    contested: list = field(default_factory=list)
+    next_poll_time: float = 0
+    last_ad_post_time: float = None
+    last_ad_break_time: float = None
+    last_stats_update_time: float = None
+    stats_interval: float = STATS_UPDATE_INTERVAL_SECONDS  # Adapted to viewer changes
+    last_viewers: int = None
+    total_errors: int = 0
+    resumed: bool = False  # Started from a checkpoint and not polled yet
+    latency: StreamLatency = None
+    next_latency_report_time: float = 0
+    # Messages that arrived in a degraded mode and skipped ones, per reason
+    overload: Counter = field(default_factory=Counter)
+
+    def __post_init__(self):
+        if self.latency is None:
+            self.latency = StreamLatency(self.live_chat_id, self.video_id)
+
+
+def chat_session_state(session, now):
+    """Checkpoint of a chat session as a JSON-serializable dict."""
+    return {
+        "broadcast_id": session.broadcast_id,
+        "video_id": session.video_id,
+        "next_page_token": session.next_page_token,
+        "processed_message_ids": list(session.processed_message_ids),
+        # Messages fetched but not moderated yet are queued again on resume
+        "pending": [
+            [
+                message_id,
+                author_channel_id,
+                author_name,
+                message_text,
+                timing.published_at,
+                timing.fetched_at,
+            ]
+            for message_id, author_channel_id, author_name, message_text, _, timing in session.pending
+        ],
+        "last_ad_post_time": session.last_ad_post_time,
+        "last_ad_break_time": session.last_ad_break_time,
+        "last_stats_update_time": session.last_stats_update_time,
+        "stats_interval": session.stats_interval,
+        "last_viewers": session.last_viewers,
+        "saved_at": now,
+    }
+
+
+def save_checkpoint(sessions, now):
+    if moderation_checkpoint is not None:
+        moderation_checkpoint.save(
+            {
+                live_chat_id: chat_session_state(session, now)
+                for live_chat_id, session in sessions.items()
+            }
+        )
+
+
+def start_chat_session(youtube, stream_ids):
+    """Begin moderating a newly found live stream."""
+    live_chat_id, broadcast_id, video_id = stream_ids
+    now = time.time()
+    if chat_archive is not None:
+        chat_archive.start_stream(live_chat_id, broadcast_id, video_id)
+    state = moderation_checkpoint.take(live_chat_id) if moderation_checkpoint else None
+    if state is not None:
+        return resume_chat_session(stream_ids, state, now)
+    session = ChatSession(
+        live_chat_id=live_chat_id,
+        broadcast_id=broadcast_id,
+        video_id=video_id,
+        next_poll_time=now + MODERATION_INTERVAL_SECONDS,
+        last_ad_post_time=now,  # start interval for promo posting
+        last_ad_break_time=0,  # start interval for ad breaks
+        last_stats_update_time=0,  # start interval for stats updates
+    )
+    # A chat taken over from another worker was already announced
+    if cluster_store is None or cluster_store.mark_started(live_chat_id):
+        enable_auto_ad_placement(youtube, broadcast_id)
+        post_message(youtube, live_chat_id)
+    return session
+
+
+def resume_chat_session(stream_ids, state, now):
+    """Continue moderating a chat from its checkpoint, without announcing it again."""
+    live_chat_id, broadcast_id, video_id = stream_ids
+    session = ChatSession(
+        live_chat_id=live_chat_id,
+        broadcast_id=broadcast_id,
+        video_id=video_id,
+        next_page_token=state["next_page_token"],
+        processed_message_ids=RecentIds(
+            PROCESSED_IDS_LIMIT, state["processed_message_ids"]
+        ),
+        next_poll_time=now,
+        last_ad_post_time=state["last_ad_post_time"],
+        last_ad_break_time=state["last_ad_break_time"],
+        last_stats_update_time=state["last_stats_update_time"],
+        stats_interval=state.get("stats_interval", STATS_UPDATE_INTERVAL_SECONDS),
+        last_viewers=state.get("last_viewers"),
+        resumed=True,
+    )
+    pending = [
+        # Checkpoints written before latency tracking have no timestamps
+        (message_id, author_channel_id, author_name, message_text, *(times or (now, now)))
+        for message_id, author_channel_id, author_name, message_text, *times in state["pending"]
+    ]
+    if cluster_store is not None and pending:
+        # The chat may have moved to another worker while this one was down
+        claimed, unfinished = cluster_store.claim_messages(
+            [entry[0] for entry in pending], cluster_worker_id
+        )
+        session.contested = [
+            (checkpoint_item(*entry[:5]), entry[5])
+            for entry in pending
+            if entry[0] in unfinished
+        ]
+        pending = [entry for entry in pending if entry[0] in claimed]
+    for message_id, author_channel_id, author_name, message_text, *times in pending:
+        queue_message(
+            session,
+            message_id,
+            author_channel_id,
+            author_name,
+            message_text,
+            {},
+            MessageTiming(*times),
+        )
+    logger.info(
+        f"♻️ Resumed chat {live_chat_id} from checkpoint "
+        f"({len(session.processed_message_ids)} handled, {len(session.pending)} pending, "
+        f"{len(session.contested)} held by another worker)."
+    )
+    return session
+
+
+def checkpoint_item(message_id, author_channel_id, author_name, message_text, published_at):
+    """A chat message resource rebuilt from a checkpoint's pending entry."""
+    return {
+        "id": message_id,
+        "snippet": {
+            "displayMessage": message_text,
+            "publishedAt": datetime.fromtimestamp(published_at, timezone.utc).isoformat(),
+        },
+        "authorDetails": {"displayName": author_name, "channelId": author_channel_id},
+    }
+
+
+def end_chat_session(session):
+    """Stop moderating a chat and drop its queued classification work."""
+    classification_pool.discard(session.live_chat_id)
+    if cluster_store is not None and session.pending:
+        # The worker that takes over the chat moderates them instead
+        cluster_store.release_claims([entry[0] for entry in session.pending])
+    video_metadata.pop(session.video_id, None)
+    video_counters.pop(session.video_id, None)
+    write_latency_summary(session)
+    if chat_archive is not None:
+        chat_archive.end_stream(session.live_chat_id)
+    logger.info(f"🔚 Stopped moderating chat {session.live_chat_id}.")
+
+
+def profiled(phase):
+    """Time a block as `phase` of the loop iteration while profiling is on."""
+    return profiler.phase(phase) if profiler is not None else nullcontext()
+
+
+def structure_sizes(sessions):
+    """Item counts of the moderator's big in-memory structures, for memory profiles."""
+    return {
+        "chats": len(sessions),
+        "processed_message_ids": sum(
+            len(session.processed_message_ids) for session in sessions.values()
+        ),
+        "known_authors": sum(len(session.known_authors) for session in sessions.values()),
+        "pending_messages": sum(len(session.pending) for session in sessions.values()),
+        "classification_backlog": classification_pool.backlog(),
+        "verdict_cache": len(verdict_cache.verdicts),
+        "authorized_users": len(authorized_users),
+        "video_metadata": len(video_metadata),
+        "video_counters": len(video_counters),
+    }
+
+
+def run_scheduled_actions(youtube, session, now):
+    """Promo messages, ad breaks and stats updates that are due for a chat."""
+    with profiled("ads"):
+        if FEATURE_AD_ACTIVE:
+            if (
+                session.last_ad_post_time is not None
+                and (now - session.last_ad_post_time) >= AD_MESSAGE_INTERVAL_SECONDS
+            ):
+                result = post_message(youtube, session.live_chat_id)
+                if result:
+                    session.last_ad_post_time = now
+                    session.total_errors = 0
+                else:
+                    session.total_errors += 1
+                    logger.warning("🚨 Failed to post advertising message.")
+
+        if FEATURE_AD_BREAK_ACTIVE:
+            if (
+                session.last_ad_break_time is not None
+                and (now - session.last_ad_break_time) >= AD_BREAK_INTERVAL_SECONDS
+            ):
+                result = trigger_ad_break(youtube, session.broadcast_id)
+                if result:
+                    session.last_ad_break_time = now
+                    session.total_errors = 0
+                else:
+                    session.total_errors += 1
+                    logger.warning("🚨 Failed to trigger ad break.")
+
+    with profiled("stats"):
+        if FEATURE_STATS_ACTIVE:
+            if (
+                session.last_stats_update_time is not None
+                and (now - session.last_stats_update_time) >= session.stats_interval
+            ):
+                stats = get_stream_statistics(youtube, session.video_id)
+                if stats:
+                    update_stats_via_api(stats)
+                    session.last_stats_update_time = now
+                    viewers = stats["concurrent_viewers"]
+                    viewers = int(viewers) if viewers is not None else None
+                    session.stats_interval = next_stats_interval(
+                        session.stats_interval, session.last_viewers, viewers
+                    )
+                    session.last_viewers = viewers
+                else:
+                    session.total_errors += 1
+                    logger.warning("🚨 Failed to get stream statistics.")
+
 
-        # Make API call to update stats
-        response = requests.post(
-            "http://localhost:5555/api/update-stats", json=api_stats, timeout=5
+def poll_chat(youtube, session, now):
+    """Fetch the next page of a chat and queue its new messages for moderation."""
+    poll_started_at = time.time()
+    with profiled("poll"):
+        chat_response = get_live_chat_messages(
+            youtube, session.live_chat_id, page_token=session.next_page_token
         )
+    session.next_poll_time = now + MODERATION_INTERVAL_SECONDS
+    if not chat_response:
+        session.total_errors += 1
+        if session.resumed:
+            # The saved page token may have expired: read the chat from the
+            # start, already handled IDs are still skipped
+            session.next_page_token = None
+            session.resumed = False
+        return
 
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("success"):
-                print(
-                    f"📝 Updated stats via API - Concurrent viewers: {api_stats['online_viewers']}, Total views: {api_stats['total_views']}"
+    session.total_errors = 0
+    session.resumed = False
+    with profiled("classify"):  # Login checks, or queueing for the LLM
+        process_chat_page(session, chat_response, poll_started_at)
+    session.next_page_token = chat_response.get("nextPageToken")
+    # Never poll faster than the API asks us to
+    polling_interval = chat_response.get("pollingIntervalMillis", 0) / 1000
+    session.next_poll_time = now + max(MODERATION_INTERVAL_SECONDS, polling_interval)
+
+
+def process_chat_page(session, chat_response, poll_started_at=None):
+    """Queue every message of a page that has not been seen before."""
+    new_messages_count = 0
+    fetched_at = time.time()
+    items = [
+        (item, fetched_at)
+        for item in chat_response.get("items", [])
+        if item["id"] not in session.processed_message_ids
+    ]
+    # Skip messages another worker handled before the chat moved here
+    claimed = None
+    if cluster_store is not None and (items or session.contested):
+        items = session.contested + items
+        claimed, unfinished = cluster_store.claim_messages(
+            [item["id"] for item, _ in items], cluster_worker_id
+        )
+        session.contested = [entry for entry in items if entry[0]["id"] in unfinished]
+    for item, fetched_at in items:
+        message_id = item["id"]
+        if claimed is not None and message_id not in claimed:
+            session.processed_message_ids.add(message_id)
+            continue
+        new_messages_count += 1
+        session.processed_message_ids.add(message_id)
+        author_name = ""
+        message_text = ""
+        try:
+            author_name = item["authorDetails"]["displayName"]
+            author_channel_id = item["authorDetails"]["channelId"]
+            message_text = item["snippet"]["displayMessage"]
+        except:
+            logger.warning(f"Error getting message: {item}")
+            continue
+        logger.debug(
+            "💬 New message from %s: %s",
+            author_name,
+            message_text,
+            extra={"sample": True, "context": {"chat": session.live_chat_id}},
+        )
+        timing = MessageTiming(
+            published_time(item, fetched_at), fetched_at, poll_started_at=poll_started_at
+        )
+        queue_message(
+            session, message_id, author_channel_id, author_name, message_text, item, timing
+        )
+
+    if new_messages_count == 0:
+        logger.debug(
+            "No new messages",
+            extra={"sample": True, "context": {"chat": session.live_chat_id}},
+        )
+
+
+def published_time(item, default):
+    """Unix time of a message's snippet.publishedAt, or `default` if missing."""
+    published_at = item.get("snippet", {}).get("publishedAt")
+    if not published_at:
+        return default
+    try:
+        return datetime.fromisoformat(published_at).timestamp()
+    except ValueError:
+        return default
+
+
+def message_risk(session, author_channel_id, message_text):
+    """
+    Risk points of a message from cheap signals: first message of the author
+    in this chat, author not logged in, a link, a long text.
+
+    Each point moves the message PRIORITY_RISK_SECONDS ahead in the
+    classification queue, and risky messages are still classified while
+    load is shed.
+    """
+    risk = 0
+    if author_channel_id not in session.known_authors:
+        risk += 1
+    if author_channel_id not in authorized_users:
+        risk += 1
+    lowered = message_text.lower()
+    if "http" in lowered or "www." in lowered:
+        risk += 2
+    if len(message_text) >= PRIORITY_LONG_MESSAGE_CHARS:
+        risk += 1
+    return risk
+
+
+def classify_with_llm(message_text, timing):
+    """Classification pool task: note when a worker took the message, then ask the LLM."""
+    timing.classify_started_at = time.time()
+    if overload_controller is not None:
+        overload_controller.note_wait(timing.classify_started_at - timing.fetched_at)
+        # A verdict after the deadline is useless, do not spend a request on it
+        if overload_controller.expired(timing.classify_started_at - timing.published_at):
+            timing.skipped = "expired"
+            timing.classifier = "skip"
+            return "SKIP"
+    return moderate_message_with_llm(message_text)
+
+
+def queue_message(
+    session, message_id, author_channel_id, author_name, message_text, item, timing
+):
+    """Start moderating a message; its verdict is applied by apply_verdicts()."""
+    future = None
+    if FEATURE_MODERATOR_ACTIVE == "LLM":
+        # Text already classified in any chat needs no place in the queue
+        cached_decision = None
+        if verdict_cache is not None and message_text:
+            cached_decision = verdict_cache.get(message_text)
+        if cached_decision:
+            timing.classifier = "cache"
+            future = Future()
+            future.set_result(cached_decision)
+        else:
+            risk = message_risk(session, author_channel_id, message_text)
+            if overload_controller is not None:
+                if overload_controller.degraded:
+                    session.overload["degraded"] += 1
+                timing.skipped = overload_controller.admit(
+                    risk, time.time() - timing.published_at
                 )
-                return True
+            if timing.skipped:
+                timing.classifier = "skip"
+                future = Future()
+                future.set_result("SKIP")
             else:
-                print(f"❌ API returned error: {data.get('error')}")
-                return False
+                timing.classifier = "llm"
+                future = classification_pool.submit(
+                    session.live_chat_id,
+                    classify_with_llm,
+                    message_text,
+                    timing,
+                    priority=timing.published_at - risk * PRIORITY_RISK_SECONDS,
+                )
+    else:
+        # Login checks are instant and must see authorizations in chat order
+        future = Future()
+        if FEATURE_MODERATOR_ACTIVE == "LOGIN":
+            timing.classifier = "rule"
+            future.set_result(
+                moderate_message_with_login(author_channel_id, message_text, item)
+            )
         else:
-            print(f"❌ API request failed with status: {response.status_code}")
-            return False
-
-    except requests.exceptions.ConnectionError:
-        print("⚠️ Cannot connect to animation server. Stats not updated.")
-        return False
-    except Exception as e:
-        print(f"❌ Error updating stats via API: {e}")
-        return False
+            future.set_result("KEEP")
+    future.add_done_callback(timing.mark_verdict)
+    session.known_authors.add(author_channel_id)
+    session.pending.append(
+        (message_id, author_channel_id, author_name, message_text, future, timing)
+    )
+
+
+def apply_verdicts(youtube, session):
+    """Delete and log every message of a chat whose verdict is ready."""
+    still_pending = []
+    ready = []  # (message_id, channel_id, name, text, decision, MessageTiming, deletion Future)
+    for entry in session.pending:
+        message_id, author_channel_id, author_name, message_text, future, timing = entry
+        if not future.done():
+            still_pending.append(entry)
+            continue
+        if future.cancelled():
+            continue
+        try:
+            moderation_decision = future.result()
+        except Exception as e:
+            logger.error(f"Unknown error while classifying message {message_id}: {e}")
+            moderation_decision = "KEEP"
+        if timing.skipped:
+            session.overload[timing.skipped] += 1
+
+        deletion = None
+        if moderation_decision == "DELETE":
+            logger.debug(
+                "🚫 Inappropriate message detected. Deleting...",
+                extra={"sample": True},
+            )
+            # The deletes of a page run in parallel
+            timing.delete_started_at = time.time()
+            deletion = api_executor.submit(delete_chat_message, youtube, message_id)
+            deletion.add_done_callback(timing.mark_deleted)
+        else:
+            logger.debug("✅ Message is acceptable.", extra={"sample": True})
+        ready.append(
+            (
+                message_id,
+                author_channel_id,
+                author_name,
+                message_text,
+                moderation_decision or "KEEP",
+                timing,
+                deletion,
+            )
+        )
 
+    # Candidate evaluation must not compete with a production backlog
+    shadow_busy = shadow_evaluator is not None and classification_pool.backlog() > 0
+    for entry in ready:
+        message_id, author_channel_id, author_name, message_text, decision, timing, deletion = entry
+        with profiled("delete"):
+            is_removed = deletion.result() if deletion is not None else False
+        session.latency.record(timing, is_removed)
+        log_started_at = time.time()
+        with profiled("log"):
+            log_chat_message(author_channel_id, author_name, message_text, is_removed)
+            if chat_archive is not None:
+                chat_archive.add(
+                    session.live_chat_id,
+                    message_id,
+                    timing.published_at,
+                    author_channel_id,
+                    author_name,
+                    message_text,
+                    decision,
+                    is_removed,
+                )
+        if message_tracer is not None:
+            message_tracer.trace(
+                session.live_chat_id,
+                message_id,
+                timing,
+                decision,
+                is_removed,
+                log_started_at,
+                time.time(),
+            )
+        if shadow_evaluator is not None and timing.classifier in ("llm", "cache"):
+            shadow_evaluator.offer(message_id, message_text, decision, busy=shadow_busy)
+    if cluster_store is not None and ready:
+        # Deleted and logged: a worker taking over the chat must not redo them
+        cluster_store.finish_claims([entry[0] for entry in ready])
+    session.pending = still_pending
 
-def main():
-    """Main function of the script."""
-    global processed_message_ids
-    global last_poll_time
 
-    print("🚀 Starting YouTube Chat Moderator Bot...")
-    if LLM_MODEL_NAME == "your-loaded-model-identifier":
-        print(
-            "🚨 IMPORTANT: Please set the correct `LLM_MODEL_NAME` in the script configurations!"
+def report_latency(session, now):
+    """Log the latency percentiles of a chat's last interval and alert on slow removals."""
+    if now < session.next_latency_report_time:
+        return
+    first_report = session.next_latency_report_time == 0
+    session.next_latency_report_time = now + LATENCY_REPORT_INTERVAL_SECONDS
+    if first_report:
+        return  # Nothing measured yet, the first interval starts now
+    window = session.latency.take_window()
+    decision, exposure = window["decision"], window["exposure"]
+    if not decision["count"]:
+        return
+    context = {"chat": session.live_chat_id}
+    logger.info(
+        f"⏱️ Decision latency of {decision['count']} messages: p50 {decision['p50']}s, "
+        f"p95 {decision['p95']}s, p99 {decision['p99']}s.",
+        extra={"context": context},
+    )
+    if not exposure["count"]:
+        return
+    logger.info(
+        f"⏱️ Exposure of {exposure['count']} removed messages: p50 {exposure['p50']}s, "
+        f"p95 {exposure['p95']}s, p99 {exposure['p99']}s.",
+        extra={"context": context},
+    )
+    if exposure["p95"] > LATENCY_ALERT_SECONDS:
+        logger.warning(
+            f"🚨 Removed messages stayed visible for {exposure['p95']}s (p95), "
+            f"above {LATENCY_ALERT_SECONDS}s. "
+            f"Fetch p95 {window['fetch']['p95']}s, classify p95 {window['classify']['p95']}s, "
+            f"delete p95 {window['delete']['p95']}s.",
+            extra={"context": context},
         )
+
+
+def write_latency_summary(session, cut_short=False):
+    """
+    Append the latency summary of an ended stream to LATENCY_SUMMARY_FILE.
+    `cut_short` marks a stream that was still running when the bot stopped.
+    """
+    summary = session.latency.summary()
+    if not summary["stages"]["decision"]["count"]:
+        return
+    if cut_short:
+        summary["cut_short"] = True
+    if session.overload:
+        summary["overload"] = dict(session.overload)
+    try:
+        with open(LATENCY_SUMMARY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+    except OSError as e:
+        logger.warning(f"⚠️ Failed to write latency summary: {e}")
         return
+    exposure = summary["stages"]["exposure"]
+    if exposure["count"]:
+        logger.info(
+            f"⏱️ Stream exposure of {exposure['count']} removed messages: "
+            f"p50 {exposure['p50']}s, p95 {exposure['p95']}s, p99 {exposure['p99']}s.",
+            extra={"context": {"chat": session.live_chat_id}},
+        )
 
-    youtube = authenticate_youtube()
-    if not youtube:
-        print("Authentication failed. Exiting.")
+
+def report_overload():
+    """Log how many messages were degraded or skipped since the last report."""
+    window = overload_controller.take_window()
+    if not window:
+        return
+    degraded = window.pop("degraded", 0)
+    skipped = ", ".join(f"{reason} {count}" for reason, count in sorted(window.items()))
+    logger.info(
+        f"🧯 {degraded} messages arrived in degraded modes, "
+        f"skipped {sum(window.values())} ({skipped or 'none'}); "
+        f"now in {overload_controller.level_name} mode."
+    )
+
+
+def report_dropped_logs():
+    """Warn about log records dropped on a full log queue since the last report."""
+    global log_dropped_reported
+    if log_handler is None or log_handler.dropped <= log_dropped_reported:
         return
+    dropped = log_handler.dropped
+    logger.warning(
+        f"🪵 {dropped - log_dropped_reported} log records were dropped on a full log queue "
+        f"({dropped} in total)."
+    )
+    log_dropped_reported = dropped
 
-    live_chat_id = None
-    broadcast_id = None
-    video_id = None
-    next_page_token = None
-    last_ad_post_time = None
-    last_moderation_time = None
-    last_ad_break_time = None
-    last_stream_ad_settings_time = None
-    last_stats_update_time = None
-    total_errors = 0
+
+def moderate_streams(youtube, find_streams, discovery_interval):
+    """
+    Moderate every chat returned by `find_streams` until interrupted.
+
+    Args:
+        youtube: an authorized youtube API client
+        find_streams: returns the (live chat ID, broadcast ID, video ID) of the
+                      chats to moderate, or None if they could not be looked up
+        discovery_interval: seconds between `find_streams` calls
+    """
+    global classification_pool
+    global overload_controller
+    global verdict_cache
+    global stats_publisher
+    global api_executor
+    from stats_publisher import StatsPublisher
+
+    classification_pool = ClassificationPool(CLASSIFICATION_WORKERS)
+    api_executor = ThreadPoolExecutor(API_WORKERS, thread_name_prefix="youtube-api")
+    verdict_cache = VerdictCache(VERDICT_CACHE_SIZE)
+    if FEATURE_OVERLOAD_ACTIVE and FEATURE_MODERATOR_ACTIVE == "LLM":
+        overload_controller = OverloadController(
+            OVERLOAD_SAMPLING_BACKLOG,
+            OVERLOAD_CACHE_ONLY_BACKLOG,
+            OVERLOAD_QUEUE_WAIT_SECONDS,
+            OVERLOAD_RECOVER_BACKLOG,
+            OVERLOAD_RECOVER_SECONDS,
+            OVERLOAD_MAX_MESSAGE_AGE_SECONDS,
+            OVERLOAD_SAMPLE_RATE,
+            OVERLOAD_MIN_RISK,
+        )
+    stats_publisher = StatsPublisher(STATS_API_URL, resend_after=STATS_RESEND_SECONDS)
+    sessions = {}  # live_chat_id -> ChatSession
+    if profiler is not None:
+        profiler.structures = lambda: structure_sizes(sessions)
+    next_discovery_time = 0
+    next_checkpoint_time = time.time() + CHECKPOINT_INTERVAL_SECONDS
+    next_report_time = time.time() + LATENCY_REPORT_INTERVAL_SECONDS
 
     try:
         while True:
-            if not live_chat_id:
-                result = get_active_stream_ids(youtube)
-                if not result:
-                    print(
-                        f"No active streams found. Retrying in {POLL_INTERVAL_SECONDS * 5} seconds..."
+            now = time.time()
+
+            if now >= next_discovery_time:
+                with profiled("discovery"):
+                    streams = find_streams()
+                if streams is not None:
+                    live_chat_ids = {stream_ids[0] for stream_ids in streams}
+                    for live_chat_id in list(sessions):
+                        if live_chat_id not in live_chat_ids:
+                            end_chat_session(sessions.pop(live_chat_id))
+                    for stream_ids in streams:
+                        if stream_ids[0] not in sessions:
+                            sessions[stream_ids[0]] = start_chat_session(
+                                youtube, stream_ids
+                            )
+                if not sessions:
+                    logger.info(
+                        f"No active streams found. Retrying in {discovery_interval} seconds..."
+                    )
+                next_discovery_time = now + discovery_interval
+
+            # Promo posts, ad breaks and stats of all chats are sent in parallel
+            scheduled = [
+                api_executor.submit(run_scheduled_actions, youtube, session, now)
+                for session in sessions.values()
+            ]
+            for future in scheduled:
+                future.result()
+
+            for session in list(sessions.values()):
+                if FEATURE_MODERATOR_ACTIVE != "" and now >= session.next_poll_time:
+                    poll_chat(youtube, session, now)
+
+                apply_verdicts(youtube, session)
+                report_latency(session, now)
+
+                if session.total_errors > 5:
+                    logger.warning(
+                        f"⚠️ Perhaps the stream has ended or chat is disabled ({session.live_chat_id})."
+                    )
+                    logger.info(
+                        f"🔁 Trying to find a new active stream in {POLL_INTERVAL_SECONDS * 3} seconds."
+                    )
+                    end_chat_session(sessions.pop(session.live_chat_id))
+                    if stream_discovery is not None:
+                        stream_discovery.invalidate()
+                    next_discovery_time = min(
+                        next_discovery_time, now + POLL_INTERVAL_SECONDS * 3
                     )
-                    time.sleep(POLL_INTERVAL_SECONDS * 5)
-                    continue
-                else:
-                    live_chat_id, broadcast_id, video_id = result
-                    # Reset processed messages and page token for a new stream/chat
-                    processed_message_ids = set()
-                    next_page_token = None
-                    last_moderation_time = time.time()
-                    last_ad_post_time = time.time()  # start interval for promo posting
-                    last_ad_break_time = 0  # start interval for ad breaks
-                    last_stream_ad_settings_time = 0
-                    last_stats_update_time = 0  # start interval for stats updates
-                    total_errors = 0
-                    enable_auto_ad_placement(youtube, broadcast_id)
-                    post_message(youtube, live_chat_id)
 
+            if overload_controller is not None:
+                overload_controller.update(classification_pool.backlog(), now)
+            if now >= next_report_time:
+                if overload_controller is not None:
+                    report_overload()
+                report_dropped_logs()
+                next_report_time = now + LATENCY_REPORT_INTERVAL_SECONDS
+
+            if now >= next_checkpoint_time:
+                with profiled("checkpoint"):
+                    save_checkpoint(sessions, now)
+                next_checkpoint_time = now + CHECKPOINT_INTERVAL_SECONDS
+
+            if profiler is not None:
+                profiler.end_iteration(now)
+
+            # Sleep until the next chat is due, but check back quickly while
+            # verdicts are still being computed
+            if any(session.pending for session in sessions.values()):
+                wake_time = now + LOOP_TICK_SECONDS
+            else:
+                wake_time = min(
+                    [next_discovery_time, next_checkpoint_time, now + POLL_INTERVAL_SECONDS]
+                    + [session.next_poll_time for session in sessions.values()]
+                )
+            time.sleep(max(0, wake_time - time.time()))
+    finally:
+        # Final checkpoint, so a clean restart resumes exactly where we stopped
+        save_checkpoint(sessions, time.time())
+        for session in sessions.values():
+            # Ctrl+C, SIGTERM or a crash must not lose the summary of a running stream
+            write_latency_summary(session, cut_short=True)
+        api_executor.shutdown(wait=False, cancel_futures=True)
+        if overload_controller is not None:
+            logger.info(f"🧯 Load shedding: {overload_controller.summary()}")
+
+
+def spawn_worker(worker_id, store_path):
+    """Start a local worker process of the cluster."""
+    return subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--role",
+            "worker",
+            "--worker-id",
+            worker_id,
+            "--store",
+            store_path,
+        ]
+    )
+
+
+def run_coordinator(youtube, store_path, worker_count):
+    """
+    Discover live chats and keep them spread over the cluster's workers.
+
+    Starts `worker_count` local workers and restarts any that exit. Workers on
+    other machines can join by opening the same store with --role worker.
+    """
+    cluster_store.add_authorized_users(authorized_users)
+    workers = {}  # worker_id -> Popen of the local workers
+    for index in range(worker_count):
+        worker_id = f"{socket.gethostname()}-{index}"
+        workers[worker_id] = spawn_worker(worker_id, store_path)
+    logger.info(f"🧩 Coordinator started {worker_count} local workers.")
+
+    next_discovery_time = 0
+    next_prune_time = 0
+    try:
+        while True:
             now = time.time()
 
-            # enable_auto_ad_placement(youtube, broadcast_id)
-
-            if FEATURE_AD_ACTIVE:
-                if (
-                    live_chat_id
-                    and last_ad_post_time is not None
-                    and (now - last_ad_post_time) >= AD_MESSAGE_INTERVAL_SECONDS
-                ):
-                    result = post_message(youtube, live_chat_id)
-                    if result:
-                        print("AD POSTED")
-                        last_ad_post_time = now
-                        total_errors = 0
-                    else:
-                        total_errors += 1
-                        print("🚨 Failed to post advertising message.")
-
-            if FEATURE_AD_BREAK_ACTIVE:
-                if (
-                    broadcast_id
-                    and last_ad_break_time is not None
-                    and (now - last_ad_break_time) >= AD_BREAK_INTERVAL_SECONDS
-                ):
-                    result = trigger_ad_break(youtube, broadcast_id)
-                    if result:
-                        last_ad_break_time = now
-                        total_errors = 0
-                    else:
-                        total_errors += 1
-                        print("🚨 Failed to trigger ad break.")
-
-            if FEATURE_STATS_ACTIVE:
-                if (
-                    video_id
-                    and last_stats_update_time is not None
-                    and (now - last_stats_update_time) >= STATS_UPDATE_INTERVAL_SECONDS
-                ):
-                    stats = get_stream_statistics(youtube, video_id)
-                    if stats:
-                        if update_stats_via_api(stats):
-                            last_stats_update_time = now
-                        else:
-                            print("🚨 Failed to update stats via API.")
-                    else:
-                        total_errors += 1
-                        print("🚨 Failed to get stream statistics.")
-
-            if FEATURE_MODERATOR_ACTIVE != "":
-                chat_response = None
-                if (
-                    live_chat_id
-                    and last_moderation_time is not None
-                    and (now - last_moderation_time) >= MODERATION_INTERVAL_SECONDS
-                ):
-                    chat_response = get_live_chat_messages(
-                        youtube, live_chat_id, page_token=next_page_token
+            for worker_id, process in workers.items():
+                if process.poll() is not None:
+                    logger.warning(
+                        f"⚠️ Worker {worker_id} exited with {process.returncode}; restarting."
                     )
-                    last_moderation_time = now
-                    if not chat_response:
-                        total_errors += 1
-
-                if chat_response:
-                    total_errors = 0
-                    new_messages_count = 0
-                    for item in chat_response.get("items", []):
-                        message_id = item["id"]
-                        if message_id not in processed_message_ids:
-                            new_messages_count += 1
-                            processed_message_ids.add(message_id)
-                            author_name = ""
-                            message_text = ""
-                            try:
-                                author_name = item["authorDetails"]["displayName"]
-                                author_channel_id = item["authorDetails"]["channelId"]
-                                message_text = item["snippet"]["displayMessage"]
-                            except:
-                                print("Error getting message: ", item)
-                                continue
-                            print(
-                                f"\n💬 New message from {author_name}: {message_text}"
-                            )
+                    # Release its chats now instead of waiting for the timeout
+                    cluster_store.remove_worker(worker_id)
+                    workers[worker_id] = spawn_worker(worker_id, store_path)
+
+            if now >= next_discovery_time:
+                streams = get_active_stream_ids(youtube)
+                if streams is not None:
+                    cluster_store.set_streams(streams)
+                next_discovery_time = now + DISCOVERY_INTERVAL_SECONDS
+
+            dead, moves = cluster_store.rebalance(WORKER_TIMEOUT_SECONDS, now)
+            for worker_id in dead:
+                logger.warning(f"💀 Worker {worker_id} stopped sending heartbeats.")
+            for live_chat_id, worker_id in moves:
+                logger.info(f"📦 Chat {live_chat_id} assigned to worker {worker_id}.")
+
+            if now >= next_prune_time:
+                cluster_store.prune_claims(CLAIM_RETENTION_SECONDS, now)
+                next_prune_time = now + CLAIM_RETENTION_SECONDS / 10
+
+            if profiler is not None:
+                profiler.end_iteration(now)
+            time.sleep(COORDINATOR_TICK_SECONDS)
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.wait()
 
-                            if FEATURE_MODERATOR_ACTIVE == "LLM":
-                                moderation_decision = moderate_message_with_llm(
-                                    message_text
-                                )
-                            elif FEATURE_MODERATOR_ACTIVE == "LOGIN":
-                                print("Login")
-                                moderation_decision = moderate_message_with_login(
-                                    author_channel_id, message_text, item
-                                )
-
-                            is_removed = False
-                            if moderation_decision == "DELETE":
-                                print(f"🚫 Inappropriate message detected. Deleting...")
-                                is_removed = delete_chat_message(youtube, message_id)
-                            else:
-                                print("✅ Message is acceptable.")
-                                is_removed = False
-
-                            log_chat_message(
-                                author_channel_id, author_name, message_text, is_removed
-                            )
 
-                    if new_messages_count == 0:
-                        print(f".", end="", flush=True)
+def run_worker(youtube, worker_id):
+    """Moderate the chats the coordinator assigns to this worker."""
+    global cluster_worker_id
+    cluster_worker_id = worker_id
 
-                    next_page_token = chat_response.get("nextPageToken")
+    def find_streams():
+        cluster_store.heartbeat(worker_id)
+        return cluster_store.assigned_streams(worker_id)
 
-            if total_errors > 5:
-                print(f"⚠️ Perhaps the stream has ended or chat is disabled.")
-                print(
-                    f"🔁 Trying to find a new active stream in {POLL_INTERVAL_SECONDS * 3} seconds."
-                )
-                live_chat_id = None  # Reset ID so the script tries to find a new stream
-                broadcast_id = None
-                video_id = None
-                next_page_token = None
-                processed_message_ids = set()
-                last_ad_post_time = None
-                last_moderation_time = None
-                last_ad_break_time = None
-                last_stats_update_time = None
-                time.sleep(POLL_INTERVAL_SECONDS * 3)
-            else:
-                time.sleep(POLL_INTERVAL_SECONDS)
+    logger.info(f"🧩 Worker {worker_id} joined the cluster.")
+    try:
+        moderate_streams(youtube, find_streams, WORKER_SYNC_SECONDS)
+    finally:
+        # Let the coordinator hand our chats out right away
+        cluster_store.remove_worker(worker_id)
 
+
+def create_shadow_evaluator():
+    """ShadowEvaluator of the candidate prompt in SHADOW_PROMPT_FILE, or None."""
+    from functools import partial
+    from moderation_shadow import ShadowEvaluator
+
+    try:
+        with open(SHADOW_PROMPT_FILE, "r", encoding="utf-8") as f:
+            candidate_prompt = f.read().strip()
+    except OSError as e:
+        logger.warning(f"⚠️ Shadow evaluation disabled, cannot read candidate prompt: {e}")
+        return None
+    model = SHADOW_MODEL_NAME or LLM_MODEL_NAME
+    logger.info(
+        f"🔀 Shadow evaluation of {SHADOW_PROMPT_FILE} on {model} "
+        f"for {SHADOW_SAMPLE_RATE:.0%} of messages."
+    )
+    return ShadowEvaluator(
+        partial(classify_with_candidate, system_prompt=candidate_prompt, model=model),
+        SHADOW_SAMPLE_RATE,
+        SHADOW_MAX_PENDING,
+        log_path=SHADOW_LOG_FILE,
+    )
+
+
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    """Main function of the script."""
+    global cluster_store
+    global moderation_checkpoint
+    global stream_discovery
+    global profiler
+    global message_tracer
+    global shadow_evaluator
+    global chat_archive
+    global log_handler
+
+    parser = argparse.ArgumentParser(description="YouTube live chat moderator.")
+    parser.add_argument(
+        "--role",
+        choices=["standalone", "coordinator", "worker"],
+        default="standalone",
+        help="standalone moderates every live chat in this process; a coordinator "
+        "assigns chats to worker processes.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CLUSTER_WORKERS,
+        help="Local worker processes started by the coordinator.",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Unique ID of this worker in the cluster.",
+    )
+    parser.add_argument(
+        "--store",
+        default=CLUSTER_STORE_FILE,
+        help="SQLite database shared by the coordinator and its workers.",
+    )
+    parser.add_argument(
+        "--log-level",
+        default=LOG_LEVEL,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="DEBUG adds sampled per-message lines.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"Profile from the start (SIGUSR1 toggles profiling at any time); "
+        f"results go to {PROFILE_DIR}/.",
+    )
+    args = parser.parse_args()
+
+    log_listener, log_handler = setup_logging(
+        args.log_level, LOG_DEBUG_SAMPLE_EVERY, LOG_QUEUE_SIZE
+    )
+    load_authorized_users()
+
+    from moderation_profiler import Profiler
+
+    profiler = Profiler(
+        PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_SECONDS, PROFILE_MEMORY_INTERVAL_SECONDS
+    )
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, profiler.request_toggle)
+    # Stop on SIGTERM like on Ctrl+C, so checkpoints and latency summaries are written
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    if args.profile:
+        profiler.start()
+
+    logger.info("🚀 Starting YouTube Chat Moderator Bot...")
+    if LLM_MODEL_NAME == "your-loaded-model-identifier":
+        logger.warning(
+            "🚨 IMPORTANT: Please set the correct `LLM_MODEL_NAME` in the script configurations!"
+        )
+        return
+
+    youtube = authenticate_youtube()
+    if not youtube:
+        logger.error("Authentication failed. Exiting.")
+        return
+
+    if args.role != "worker":
+        stream_discovery = StreamDiscovery(DISCOVERY_CACHE_SECONDS)
+    if args.role != "standalone":
+        from moderation_cluster import ClusterStore
+
+        cluster_store = ClusterStore(args.store)
+    if args.role != "coordinator":
+        checkpoint_file = CHECKPOINT_FILE
+        if args.role == "worker":
+            root, ext = os.path.splitext(CHECKPOINT_FILE)
+            checkpoint_file = f"{root}-{args.worker_id}{ext}"
+        moderation_checkpoint = ModerationCheckpoint(
+            checkpoint_file, CHECKPOINT_MAX_AGE_SECONDS
+        )
+        if FEATURE_TRACING_ACTIVE:
+            from moderation_tracing import MessageTracer
+
+            trace_file = TRACE_FILE
+            if args.role == "worker":
+                root, ext = os.path.splitext(TRACE_FILE)
+                trace_file = f"{root}-{args.worker_id}{ext}"
+            message_tracer = MessageTracer(
+                trace_file, TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS
+            )
+        if FEATURE_SHADOW_ACTIVE:
+            shadow_evaluator = create_shadow_evaluator()
+        if FEATURE_ARCHIVE_ACTIVE:
+            from moderation_archive import ChatArchive
+
+            chat_archive = ChatArchive(
+                CHAT_ARCHIVE_FILE, ARCHIVE_BATCH_SIZE, ARCHIVE_FLUSH_SECONDS
+            )
+        started = time.perf_counter()
+        restored = moderation_checkpoint.load()
+        if restored:
+            logger.info(
+                f"♻️ Loaded checkpoint of {restored} chats in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms."
+            )
+
+    try:
+        if args.role == "coordinator":
+            run_coordinator(youtube, args.store, args.workers)
+        elif args.role == "worker":
+            run_worker(youtube, args.worker_id)
+        else:
+            moderate_streams(
+                youtube,
+                lambda: get_active_stream_ids(youtube),
+                DISCOVERY_INTERVAL_SECONDS,
+            )
     except KeyboardInterrupt:
-        print("\n🛑 Bot stopped by user.")
+        logger.info("🛑 Bot stopped by user.")
     except Exception as e:
-        print(f"💥 Critical error in main loop: {e}")
+        logger.exception(f"💥 Critical error in main loop: {e}")
     finally:
-        print("👋 Shutting down bot.")
+        profiler.stop()  # Writes out the stack samples of an active profile
+        if message_tracer is not None:
+            message_tracer.close()
+        if shadow_evaluator is not None:
+            logger.info(f"🔀 Shadow evaluation: {shadow_evaluator.summary()}")
+            shadow_evaluator.close()
+        if chat_archive is not None:
+            chat_archive.close()
+        if credential_refresher is not None:
+            credential_refresher.stop()
+        if api_http is not None:
+            api_http.close()  # Keep-alive connections of all API threads
+        logger.info("👋 Shutting down bot.")
+        log_listener.stop()  # Writes out everything still queued
+        if log_handler.dropped:
+            # The listener is stopped, so this cannot go through the log queue
+            print(f"⚠️ {log_handler.dropped} log records were dropped on a full log queue.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+"""
+Thread-safe HTTP transport for the YouTube API client.
+
+googleapiclient sends every request of a client through one httplib2.Http,
+which must not be used by two threads at once. PooledHttp gives each thread
+its own authorized keep-alive connection instead, so one client can delete
+messages, post, insert cuepoints and read stats from several threads.
+
+All connections share one set of OAuth credentials. CredentialRefresher
+renews the token in a background thread a few minutes before it expires, so
+API calls never stop to refresh it inline.
+"""
+
+import datetime
+import logging
+import threading
+
+import google_auth_httplib2
+import httplib2
+
+logger = logging.getLogger("youtube_moderator.transport")
+
+
+class PooledHttp:
+    """httplib2-compatible object that sends each request over the calling thread's connection."""
+
+    def __init__(self, credentials, timeout=30):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []  # Every AuthorizedHttp created, to close them
+
+    def connection(self):
+        """Authorized connection of the current thread, opened on first use."""
+        http = getattr(self.local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials, http=httplib2.Http(timeout=self.timeout)
+            )
+            self.local.http = http
+            with self.lock:
+                self.connections.append(http)
+        return http
+
+    def request(self, *args, **kwargs):
+        return self.connection().request(*args, **kwargs)
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for http in connections:
+            http.close()
+
+
+class CredentialRefresher:
+    """Renews an OAuth token in the background before it expires."""
+
+    def __init__(self, credentials, margin=300, retry=30, on_refresh=None):
+        """
+        Args:
+            credentials: google.oauth2 credentials with a refresh token
+            margin: seconds before expiry at which the token is renewed
+            retry: seconds to wait after a failed refresh
+            on_refresh: called with the credentials after each refresh
+        """
+        self.credentials = credentials
+        self.margin = margin
+        self.retry = retry
+        self.on_refresh = on_refresh
+        self.refreshes = 0
+        self.failures = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def seconds_until_refresh(self):
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return None  # Token without expiry, nothing to renew
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds() - self.margin
+
+    def _run(self):
+        from google.auth.transport.requests import Request
+
+        request = Request()  # Own session, never shared with the API calls
+        while not self.stopped.is_set():
+            wait = self.seconds_until_refresh()
+            if wait is None:
+                return
+            if wait > 0:
+                self.stopped.wait(wait)
+                continue
+            try:
+                self.credentials.refresh(request)
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"⚠️ Failed to refresh the YouTube token: {e}")
+                self.stopped.wait(self.retry)
+                continue
+            self.refreshes += 1
+            logger.info(f"🔑 Refreshed the YouTube token, valid until {self.credentials.expiry} UTC.")
+            if self.on_refresh is not None:
+                self.on_refresh(self.credentials)